@@ -5,10 +5,10 @@ from alembic import context
 import os
 import sys
 
-# Add the src directory to the path so we can import our models
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+# Add the service root to the path so we can import our models
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from models import Base
+from src.models import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -16,6 +16,12 @@ branch_labels = None
 depends_on = None
 
 def upgrade():
+    # The whole upgrade runs in Alembic's single transaction; skip waiting on WAL
+    # flushes for each statement since the transaction is all-or-nothing anyway
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        bind.exec_driver_sql("SET LOCAL synchronous_commit = OFF")
+
     # Create stations table
     op.create_table('stations',
         sa.Column('id', sa.Integer(), nullable=False),
@@ -27,8 +33,6 @@ def upgrade():
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index(op.f('ix_stations_code'), 'stations', ['code'], unique=True)
-    op.create_index(op.f('ix_stations_id'), 'stations', ['id'], unique=False)
 
     # Create tracks table
     op.create_table('tracks',
@@ -45,8 +49,6 @@ def upgrade():
         sa.ForeignKeyConstraint(['to_station_id'], ['stations.id'], ),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index(op.f('ix_tracks_id'), 'tracks', ['id'], unique=False)
-    op.create_index(op.f('ix_tracks_segment_id'), 'tracks', ['segment_id'], unique=True)
 
     # Create trains table
     op.create_table('trains',
@@ -67,8 +69,6 @@ def upgrade():
         sa.ForeignKeyConstraint(['current_track_id'], ['tracks.id'], ),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index(op.f('ix_trains_id'), 'trains', ['id'], unique=False)
-    op.create_index(op.f('ix_trains_train_number'), 'trains', ['train_number'], unique=True)
 
     # Create train_events table
     op.create_table('train_events',
@@ -85,7 +85,6 @@ def upgrade():
         sa.ForeignKeyConstraint(['train_id'], ['trains.id'], ),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index(op.f('ix_train_events_id'), 'train_events', ['id'], unique=False)
 
     # Create timetable_entries table
     op.create_table('timetable_entries',
@@ -102,6 +101,15 @@ def upgrade():
         sa.ForeignKeyConstraint(['train_id'], ['trains.id'], ),
         sa.PrimaryKeyConstraint('id')
     )
+
+    # Create indexes once all tables exist
+    op.create_index(op.f('ix_stations_code'), 'stations', ['code'], unique=True)
+    op.create_index(op.f('ix_stations_id'), 'stations', ['id'], unique=False)
+    op.create_index(op.f('ix_tracks_id'), 'tracks', ['id'], unique=False)
+    op.create_index(op.f('ix_tracks_segment_id'), 'tracks', ['segment_id'], unique=True)
+    op.create_index(op.f('ix_trains_id'), 'trains', ['id'], unique=False)
+    op.create_index(op.f('ix_trains_train_number'), 'trains', ['train_number'], unique=True)
+    op.create_index(op.f('ix_train_events_id'), 'train_events', ['id'], unique=False)
     op.create_index(op.f('ix_timetable_entries_id'), 'timetable_entries', ['id'], unique=False)
 
 def downgrade():
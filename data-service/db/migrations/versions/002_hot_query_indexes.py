@@ -0,0 +1,36 @@
+"""Indexes for hot query predicates
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-01-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Partial indexes backing the /status and /summary counts
+    op.create_index('ix_trains_status_running', 'trains', ['id'], unique=False,
+                    postgresql_where=sa.text("status = 'running'"))
+    op.create_index('ix_trains_delay_minutes', 'trains', ['delay_minutes'], unique=False,
+                    postgresql_where=sa.text('delay_minutes > 0'))
+
+    # Timetable lookups by train and station
+    op.create_index('ix_timetable_train_station', 'timetable_entries', ['train_id', 'station_id'], unique=False)
+
+    # Postgres does not index foreign key columns automatically
+    op.create_index(op.f('ix_train_events_train_id'), 'train_events', ['train_id'], unique=False)
+    op.create_index(op.f('ix_train_events_station_id'), 'train_events', ['station_id'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_train_events_station_id'), table_name='train_events')
+    op.drop_index(op.f('ix_train_events_train_id'), table_name='train_events')
+    op.drop_index('ix_timetable_train_station', table_name='timetable_entries')
+    op.drop_index('ix_trains_delay_minutes', table_name='trains')
+    op.drop_index('ix_trains_status_running', table_name='trains')
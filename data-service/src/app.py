@@ -1,8 +1,12 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 import logging
+import os
 import time
 
 from .database import get_db, engine
@@ -13,23 +17,20 @@ from .schemas import (
 )
 from .crud import (
     create_topology, create_timetable_entry, 
-    update_train_position, get_system_status
+    bulk_update_positions, get_system_status
 )
-from .middleware import LoggingMiddleware, MetricsMiddleware
-from .metrics import record_request_metrics, get_metrics
+from .middleware import LoggingMiddleware
+from .metrics import get_metrics
 from .utils import generate_train_status_summary
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="RailOptima Data Service",
     description="Data ingestion and management service for railway operations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Add middleware
-metrics_middleware = MetricsMiddleware(app)
+# Add middleware; LoggingMiddleware also records the prometheus request metrics
 app.add_middleware(LoggingMiddleware)
 
 # Configure CORS
@@ -45,29 +46,18 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    # Record metrics
-    record_request_metrics(
-        method=request.method,
-        endpoint=request.url.path,
-        status_code=response.status_code,
-        duration=process_time
-    )
-    
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+# Schema is managed by Alembic; create_all is only a local development shortcut
+if os.getenv("AUTO_CREATE_SCHEMA"):
+    @app.on_event("startup")
+    def create_tables():
+        Base.metadata.create_all(bind=engine)
 
 @app.get("/")
 async def root():
     return {"message": "RailOptima Data Service", "version": "1.0.0"}
 
 @app.post("/topology", response_model=TopologyResponse)
-async def upload_topology(
+def upload_topology(
     topology: TopologyUpload,
     db: Session = Depends(get_db)
 ):
@@ -81,7 +71,7 @@ async def upload_topology(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/timetable")
-async def upload_timetable(
+def upload_timetable(
     timetable: TimetableUpload,
     db: Session = Depends(get_db)
 ):
@@ -94,17 +84,32 @@ async def upload_timetable(
         logger.error(f"Error uploading timetable: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/positions")
-async def ingest_positions(
-    positions: List[PositionUpdate],
+_position_batch = TypeAdapter(List[PositionUpdate])
+
+async def parse_position_batch(request: Request) -> List[PositionUpdate]:
+    """Decode and validate the raw body in one pass through pydantic-core"""
+    try:
+        return _position_batch.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+@app.post(
+    "/positions",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": PositionUpdate.model_json_schema()}}}
+    }}
+)
+def ingest_positions(
+    positions: List[PositionUpdate] = Depends(parse_position_batch),
     db: Session = Depends(get_db)
 ):
     """Ingest real-time GPS/SCADA feed"""
     try:
-        updated_count = 0
-        for position in positions:
-            update_train_position(db, position)
-            updated_count += 1
+        updated_count = len(positions)
+        bulk_update_positions(db, positions)
         
         logger.info(f"Updated positions for {updated_count} trains")
         return {"message": f"Updated {updated_count} train positions"}
@@ -113,7 +118,7 @@ async def ingest_positions(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/status", response_model=StatusResponse)
-async def get_status(db: Session = Depends(get_db)):
+def get_status(db: Session = Depends(get_db)):
     """Get system health and current counts"""
     try:
         status = get_system_status(db)
@@ -123,7 +128,7 @@ async def get_status(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/summary")
-async def get_summary(db: Session = Depends(get_db)):
+def get_summary(db: Session = Depends(get_db)):
     """Get detailed system summary with train status breakdown"""
     try:
         summary = generate_train_status_summary(db)
@@ -1,125 +1,255 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import column, func, insert, select, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Any
+import io
+import numpy as np
 
 from .models import Station, Track, Train, TrainEvent, TimetableEntry
 from .schemas import TopologyUpload, TimetableUpload, PositionUpdate, StatusResponse
+from .utils import calculate_distance_batch, get_station_ids, invalidate_topology_cache
+
+# Rows per INSERT when bulk loading timetable entries
+TIMETABLE_INSERT_CHUNK_SIZE = 500
+
+# Position batches at least this large go through COPY on Postgres
+POSITION_COPY_THRESHOLD = 1000
+
+_POSITION_COLUMNS = (
+    "train_number", "train_type", "latitude", "longitude", "speed_kmh",
+    "status", "delay_minutes", "last_updated", "current_station_id"
+)
+
+# Per-connection staging table for COPY-based position ingest
+_trains_stage = table("trains_stage", *(column(name) for name in _POSITION_COLUMNS))
+
+# COPY text format escapes; \N is NULL, so empty strings load as ''
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
 
 def create_topology(db: Session, topology: TopologyUpload):
-    stations_created = 0
-    tracks_created = 0
+    # Create stations in a single INSERT, skipping codes that already exist
+    station_codes = [station_data.code for station_data in topology.stations]
+    existing_codes = set(db.scalars(select(Station.code).where(Station.code.in_(station_codes))))
     
-    # Create stations
+    station_rows = []
     for station_data in topology.stations:
-        existing = db.query(Station).filter(Station.code == station_data.code).first()
-        if not existing:
-            station = Station(
-                code=station_data.code,
-                name=station_data.name,
-                latitude=station_data.latitude,
-                longitude=station_data.longitude,
-                platforms=station_data.platforms
+        if station_data.code not in existing_codes:
+            station_rows.append(station_data.model_dump())
+            existing_codes.add(station_data.code)
+    
+    if station_rows:
+        db.execute(insert(Station), station_rows)
+    
+    # Resolve every station referenced by the tracks with one lookup
+    track_station_codes = {track_data.from_station for track_data in topology.tracks}
+    track_station_codes.update(track_data.to_station for track_data in topology.tracks)
+    stations = {
+        code: (station_id, latitude, longitude)
+        for code, station_id, latitude, longitude in db.execute(
+            select(Station.code, Station.id, Station.latitude, Station.longitude).where(
+                Station.code.in_(track_station_codes)
             )
-            db.add(station)
-            stations_created += 1
+        )
+    }
     
-    db.commit()
+    segment_ids = [track_data.segment_id for track_data in topology.tracks]
+    existing_segments = set(db.scalars(select(Track.segment_id).where(Track.segment_id.in_(segment_ids))))
     
-    # Create tracks
+    # Create tracks in a single INSERT
+    track_rows = []
+    missing_distance = []
     for track_data in topology.tracks:
-        existing = db.query(Track).filter(Track.segment_id == track_data.segment_id).first()
-        if not existing:
-            from_station = db.query(Station).filter(Station.code == track_data.from_station).first()
-            to_station = db.query(Station).filter(Station.code == track_data.to_station).first()
-            
-            if from_station and to_station:
-                track = Track(
-                    segment_id=track_data.segment_id,
-                    from_station_id=from_station.id,
-                    to_station_id=to_station.id,
-                    distance_km=track_data.distance_km,
-                    max_speed_kmh=track_data.max_speed_kmh,
-                    is_electrified=track_data.is_electrified,
-                    track_type=track_data.track_type
-                )
-                db.add(track)
-                tracks_created += 1
+        if track_data.segment_id in existing_segments:
+            continue
+        
+        from_station = stations.get(track_data.from_station)
+        to_station = stations.get(track_data.to_station)
+        
+        if from_station and to_station:
+            if track_data.distance_km is None:
+                missing_distance.append((len(track_rows), from_station, to_station))
+            track_rows.append({
+                "segment_id": track_data.segment_id,
+                "from_station_id": from_station[0],
+                "to_station_id": to_station[0],
+                "distance_km": track_data.distance_km,
+                "max_speed_kmh": track_data.max_speed_kmh,
+                "is_electrified": track_data.is_electrified,
+                "track_type": track_data.track_type
+            })
+            existing_segments.add(track_data.segment_id)
+    
+    # Fill omitted distances from station coordinates in one batch
+    if missing_distance:
+        coords = np.array(
+            [(a[1], a[2], b[1], b[2]) for _, a, b in missing_distance], dtype=np.float64
+        ).reshape(-1, 4)
+        distances = calculate_distance_batch(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        for (row_index, _, _), distance in zip(missing_distance, distances):
+            # Stations without coordinates give NaN; leave those unset
+            if not np.isnan(distance):
+                track_rows[row_index]["distance_km"] = round(float(distance), 3)
+    
+    if track_rows:
+        db.execute(insert(Track), track_rows)
     
     db.commit()
     
+    if station_rows or track_rows:
+        invalidate_topology_cache()
+    
     return {
         "message": "Topology uploaded successfully",
-        "stations_created": stations_created,
-        "tracks_created": tracks_created
+        "stations_created": len(station_rows),
+        "tracks_created": len(track_rows)
     }
 
 def create_timetable_entry(db: Session, timetable: TimetableUpload):
+    train_numbers = {entry_data.train_number for entry_data in timetable.entries}
+    
+    # Preload train ids in one query; station ids come from the topology cache
+    train_ids = dict(db.execute(
+        select(Train.train_number, Train.id).where(Train.train_number.in_(train_numbers))
+    ).all())
+    station_ids = get_station_ids(db, {entry_data.station_code for entry_data in timetable.entries})
+    
+    # Create missing trains in a single INSERT
+    missing_trains = [
+        {"train_number": train_number, "train_type": "passenger", "status": "scheduled"}
+        for train_number in sorted(train_numbers - train_ids.keys())
+    ]
+    if missing_trains:
+        created = db.execute(insert(Train).returning(Train.train_number, Train.id), missing_trains)
+        train_ids.update(created.all())
+    
+    entry_rows = []
     for entry_data in timetable.entries:
-        # Get or create train
-        train = db.query(Train).filter(Train.train_number == entry_data.train_number).first()
-        if not train:
-            train = Train(
-                train_number=entry_data.train_number,
-                train_type="passenger",
-                status="scheduled"
-            )
-            db.add(train)
-            db.commit()
-        
-        # Get station
-        station = db.query(Station).filter(Station.code == entry_data.station_code).first()
-        if station:
-            entry = TimetableEntry(
-                train_id=train.id,
-                station_id=station.id,
-                arrival_time=entry_data.arrival_time,
-                departure_time=entry_data.departure_time,
-                platform_number=entry_data.platform_number,
-                stop_duration_minutes=entry_data.stop_duration_minutes
-            )
-            db.add(entry)
+        station_id = station_ids.get(entry_data.station_code)
+        if station_id:
+            entry_rows.append({
+                "train_id": train_ids[entry_data.train_number],
+                "station_id": station_id,
+                "arrival_time": entry_data.arrival_time,
+                "departure_time": entry_data.departure_time,
+                "platform_number": entry_data.platform_number,
+                "stop_duration_minutes": entry_data.stop_duration_minutes
+            })
+    
+    for i in range(0, len(entry_rows), TIMETABLE_INSERT_CHUNK_SIZE):
+        db.execute(insert(TimetableEntry), entry_rows[i:i + TIMETABLE_INSERT_CHUNK_SIZE])
     
     db.commit()
     return {"message": "Timetable entries created"}
 
-def update_train_position(db: Session, position: PositionUpdate):
-    train = db.query(Train).filter(Train.train_number == position.train_number).first()
-    if not train:
-        train = Train(
-            train_number=position.train_number,
-            train_type="passenger",
-            status=position.status
-        )
-        db.add(train)
-    
-    # Update position
-    train.latitude = position.latitude
-    train.longitude = position.longitude
-    train.speed_kmh = position.speed_kmh
-    train.status = position.status
-    train.delay_minutes = position.delay_minutes
-    train.last_updated = position.timestamp
-    
-    # Update current station if provided
-    if position.current_station:
-        station = db.query(Station).filter(Station.code == position.current_station).first()
-        if station:
-            train.current_station_id = station.id
+def _dialect_insert(db: Session):
+    """Return the dialect-specific insert() that supports ON CONFLICT"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+def bulk_update_positions(db: Session, positions: List[PositionUpdate]) -> int:
+    if not positions:
+        return 0
+    
+    station_ids = get_station_ids(db, {position.current_station for position in positions})
+    
+    # Later updates for the same train win, as they did with sequential updates
+    rows = {}
+    for position in positions:
+        previous = rows.get(position.train_number)
+        station_id = station_ids.get(position.current_station)
+        if station_id is None and previous:
+            station_id = previous["current_station_id"]
+        
+        rows[position.train_number] = {
+            "train_number": position.train_number,
+            "train_type": "passenger",
+            "latitude": position.latitude,
+            "longitude": position.longitude,
+            "speed_kmh": position.speed_kmh,
+            "status": position.status,
+            "delay_minutes": position.delay_minutes,
+            "last_updated": position.timestamp,
+            "current_station_id": station_id
+        }
+    rows = list(rows.values())
+    
+    if len(rows) >= POSITION_COPY_THRESHOLD and db.get_bind().dialect.name == "postgresql":
+        _copy_positions(db, rows)
+    else:
+        _upsert_positions(db, rows)
     
     db.commit()
+    return len(rows)
+
+def _on_position_conflict(stmt):
+    """Update the position columns of trains that already exist instead of inserting them"""
+    return stmt.on_conflict_do_update(
+        index_elements=[Train.train_number],
+        set_={
+            "latitude": stmt.excluded.latitude,
+            "longitude": stmt.excluded.longitude,
+            "speed_kmh": stmt.excluded.speed_kmh,
+            "status": stmt.excluded.status,
+            "delay_minutes": stmt.excluded.delay_minutes,
+            "last_updated": stmt.excluded.last_updated,
+            # Keep the current station when the update does not resolve one
+            "current_station_id": func.coalesce(stmt.excluded.current_station_id, Train.current_station_id)
+        }
+    )
+
+def _upsert_positions(db: Session, rows: List[Dict[str, Any]]):
+    db.execute(_on_position_conflict(_dialect_insert(db)(Train).values(rows)))
+
+def _copy_field(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+def _copy_positions(db: Session, rows: List[Dict[str, Any]]):
+    """COPY rows into a temp staging table, then upsert them in one INSERT ... ON CONFLICT"""
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS trains_stage ON COMMIT DELETE ROWS AS "
+        f"SELECT {', '.join(_POSITION_COLUMNS)} FROM trains WITH NO DATA"
+    ))
+    
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join([_copy_field(row[name]) for name in _POSITION_COLUMNS]))
+        buffer.write("\n")
+    buffer.seek(0)
+    
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY trains_stage ({', '.join(_POSITION_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+    
+    # rows holds one row per train, so no train is updated twice by the statement
+    stage = _trains_stage.c
+    db.execute(_on_position_conflict(
+        pg_insert(Train).from_select(list(_POSITION_COLUMNS), select(*(stage[name] for name in _POSITION_COLUMNS)))
+    ))
+
+def update_train_position(db: Session, position: PositionUpdate):
+    bulk_update_positions(db, [position])
 
 def get_system_status(db: Session) -> StatusResponse:
-    total_stations = db.query(func.count(Station.id)).scalar()
-    total_tracks = db.query(func.count(Track.id)).scalar()
-    active_trains = db.query(func.count(Train.id)).filter(Train.status == "running").scalar()
-    total_events = db.query(func.count(TrainEvent.id)).scalar()
+    # All counts in a single round trip
+    counts = db.execute(select(
+        select(func.count(Station.id)).scalar_subquery().label("total_stations"),
+        select(func.count(Track.id)).scalar_subquery().label("total_tracks"),
+        select(func.count(Train.id)).where(Train.status == "running").scalar_subquery().label("active_trains"),
+        select(func.count(TrainEvent.id)).scalar_subquery().label("total_events")
+    )).one()
     
     return StatusResponse(
         status="healthy",
-        total_stations=total_stations,
-        total_tracks=total_tracks,
-        active_trains=active_trains,
-        total_events=total_events,
+        total_stations=counts.total_stations,
+        total_tracks=counts.total_tracks,
+        active_trains=counts.active_trains,
+        total_events=counts.total_events,
         last_updated=datetime.utcnow()
     )
@@ -1,5 +1,5 @@
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
-from fastapi import Response
+from prometheus_client import Counter, Histogram, Gauge, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from fastapi.responses import StreamingResponse
 import time
 
 # Metrics
@@ -19,6 +19,19 @@ def update_train_metrics(active_count: int, delayed_count: int):
     ACTIVE_TRAINS.set(active_count)
     DELAYED_TRAINS.set(delayed_count)
 
+class _SingleFamily:
+    """Collector exposing one already-collected metric family"""
+    def __init__(self, family):
+        self.family = family
+    
+    def collect(self):
+        return [self.family]
+
+def _iter_metrics(registry=REGISTRY):
+    for family in registry.collect():
+        yield generate_latest(_SingleFamily(family))
+
 def get_metrics():
-    """Return Prometheus metrics"""
-    return Response(generate_latest(), media_type="text/plain")
+    """Return Prometheus metrics, encoded one metric family at a time"""
+    # Passed as a header so Starlette does not append a second charset
+    return StreamingResponse(_iter_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSON
 from datetime import datetime
@@ -16,7 +16,7 @@ class Station(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    tracks = relationship("Track", back_populates="station")
+    tracks = relationship("Track", back_populates="station", foreign_keys="Track.from_station_id")
 
 class Track(Base):
     __tablename__ = "tracks"
@@ -32,7 +32,7 @@ class Track(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    station = relationship("Station", back_populates="tracks")
+    station = relationship("Station", back_populates="tracks", foreign_keys=[from_station_id])
 
 class Train(Base):
     __tablename__ = "trains"
@@ -53,14 +53,21 @@ class Train(Base):
     
     # Relationships
     events = relationship("TrainEvent", back_populates="train")
+    
+    __table_args__ = (
+        Index("ix_trains_status_running", "id",
+              postgresql_where=text("status = 'running'"), sqlite_where=text("status = 'running'")),
+        Index("ix_trains_delay_minutes", "delay_minutes",
+              postgresql_where=text("delay_minutes > 0"), sqlite_where=text("delay_minutes > 0")),
+    )
 
 class TrainEvent(Base):
     __tablename__ = "train_events"
     
     id = Column(Integer, primary_key=True, index=True)
-    train_id = Column(Integer, ForeignKey("trains.id"))
+    train_id = Column(Integer, ForeignKey("trains.id"), index=True)
     event_type = Column(String(20))  # arrival, departure, delay, conflict
-    station_id = Column(Integer, ForeignKey("stations.id"))
+    station_id = Column(Integer, ForeignKey("stations.id"), index=True)
     scheduled_time = Column(DateTime)
     actual_time = Column(DateTime)
     delay_minutes = Column(Integer, default=0)
@@ -82,3 +89,7 @@ class TimetableEntry(Base):
     stop_duration_minutes = Column(Integer, default=2)
     distance_from_origin = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_timetable_train_station", "train_id", "station_id"),
+    )
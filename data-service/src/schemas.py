@@ -13,7 +13,7 @@ class TrackData(BaseModel):
     segment_id: str
     from_station: str
     to_station: str
-    distance_km: float
+    distance_km: Optional[float] = None  # great-circle distance between the stations when omitted
     max_speed_kmh: int = 100
     is_electrified: bool = True
     track_type: str = "double"
@@ -1,78 +1,293 @@
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-import json
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
 import logging
+from math import radians
+import threading
+import time
+import numpy as np
+from sqlalchemy import func, select, text, tuple_
 from sqlalchemy.orm import Session
 from .models import Station, Track, Train
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+EARTH_RADIUS_KM = 6371
+
+# Longest multi-hop route get_route_between_stations will search for
+MAX_ROUTE_HOPS = 12
+# Hop limits tried in turn; each search only enumerates paths up to its limit
+ROUTE_SEARCH_DEPTHS = (2, 4, 8, MAX_ROUTE_HOPS)
+ROUTE_CACHE_SIZE = 1024
+
+# Seconds a station code -> id map is trusted before it is reloaded; uploads
+# through this process invalidate it immediately, and stations created
+# elsewhere are looked up on a miss
+STATION_CACHE_TTL_SECONDS = 60
+# Seconds a cached route is trusted; tracks written by other workers show up after that
+ROUTE_CACHE_TTL_SECONDS = STATION_CACHE_TTL_SECONDS
+
+# Station ids and coordinates (radians) used by find_nearest_station, loaded
+# lazily, reloaded after STATION_CACHE_TTL_SECONDS like the station maps and
+# dropped whenever the topology changes in this process
+_station_coords: Optional[Dict[str, np.ndarray]] = None
+_station_coords_expires = 0.0
+
+# Station code -> id map and its reverse, replaced wholesale on refresh
+_station_ids: Dict[str, int] = {}
+_station_codes: Dict[int, str] = {}
+_station_cache_expires = 0.0
+_station_cache_lock = threading.Lock()
+
+# (from_station_code, to_station_code) -> (expiry, route), least recently used first
+_route_cache: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+# Shortest path by hop count over tracks in either direction; track ids are
+# accumulated in track_path and visited stations in visited to avoid cycles
+_MULTI_HOP_ROUTE_SQL = text("""
+    WITH RECURSIVE edges(track_id, from_id, to_id) AS (
+        SELECT id, from_station_id, to_station_id FROM tracks
+        UNION ALL
+        SELECT id, to_station_id, from_station_id FROM tracks
+    ),
+    route(station_id, track_path, visited, hops) AS (
+        SELECT CAST(:src AS INTEGER), CAST('' AS TEXT), CAST(:src_visited AS TEXT), 0
+        UNION ALL
+        SELECT e.to_id,
+               r.track_path || CAST(e.track_id AS TEXT) || ',',
+               r.visited || CAST(e.to_id AS TEXT) || ',',
+               r.hops + 1
+        FROM route r JOIN edges e ON e.from_id = r.station_id
+        WHERE r.hops < :max_hops
+          AND r.station_id != :dst
+          AND r.visited NOT LIKE '%,' || CAST(e.to_id AS TEXT) || ',%'
+    )
+    SELECT track_path FROM route WHERE station_id = :dst ORDER BY hops LIMIT 1
+""")
+
+def invalidate_topology_cache():
+    """Drop cached station and route data so the next lookup reloads it"""
+    global _station_coords, _station_coords_expires, _station_cache_expires
+    _station_coords = None
+    _station_coords_expires = 0.0
+    _station_cache_expires = 0.0
+    _route_cache.clear()
+
+def _load_station_maps(db: Session):
+    """Reload both station maps once the TTL expires"""
+    global _station_ids, _station_codes, _station_cache_expires
+    if time.monotonic() >= _station_cache_expires:
+        with _station_cache_lock:
+            if time.monotonic() >= _station_cache_expires:
+                station_ids = dict(db.execute(select(Station.code, Station.id)).all())
+                _station_ids = station_ids
+                _station_codes = {station_id: code for code, station_id in station_ids.items()}
+                _station_cache_expires = time.monotonic() + STATION_CACHE_TTL_SECONDS
+
+def _merge_stations(db: Session, condition):
+    """Look up the stations matching condition and add them to both maps"""
+    global _station_ids, _station_codes
+    rows = db.execute(select(Station.code, Station.id).where(condition)).all()
+    if rows:
+        with _station_cache_lock:
+            # Copies, so readers holding the old maps never see them change
+            _station_ids = {**_station_ids, **dict(rows)}
+            _station_codes = {**_station_codes, **{station_id: code for code, station_id in rows}}
+
+def get_station_ids(db: Session, codes: Iterable[Optional[str]] = ()) -> Dict[str, int]:
+    """
+    Station code -> id for the whole network, reloaded once the TTL expires.
+    Any of codes missing from the map, such as a station another worker just
+    created, is looked up before returning; codes still missing do not exist
+    """
+    _load_station_maps(db)
+    missing = {code for code in codes if code is not None and code not in _station_ids}
+    if missing:
+        _merge_stations(db, Station.code.in_(missing))
+    return _station_ids
+
+def get_station_codes(db: Session, station_ids: Iterable[int] = ()) -> Dict[int, str]:
+    """Station id -> code, the reverse of get_station_ids, looking up any of station_ids it lacks"""
+    _load_station_maps(db)
+    missing = {station_id for station_id in station_ids if station_id not in _station_codes}
+    if missing:
+        _merge_stations(db, Station.id.in_(missing))
+    return _station_codes
+
+def _get_station_coords(db: Session) -> Dict[str, np.ndarray]:
+    """Coordinates of every located station, reloaded once the TTL expires"""
+    global _station_coords, _station_coords_expires
+    coords = _station_coords
+    if coords is None or time.monotonic() >= _station_coords_expires:
+        with _station_cache_lock:
+            coords = _station_coords
+            if coords is None or time.monotonic() >= _station_coords_expires:
+                rows = db.execute(
+                    select(Station.id, Station.latitude, Station.longitude).where(
+                        Station.latitude.isnot(None),
+                        Station.longitude.isnot(None)
+                    ).order_by(Station.id)
+                ).all()
+                latlon = np.radians(np.array([(lat, lon) for _, lat, lon in rows], dtype=np.float64).reshape(-1, 2))
+                coords = {
+                    "ids": np.array([station_id for station_id, _, _ in rows], dtype=np.int64),
+                    "lats": latlon[:, 0],
+                    "lons": latlon[:, 1]
+                }
+                _station_coords = coords
+                _station_coords_expires = time.monotonic() + STATION_CACHE_TTL_SECONDS
+    return coords
+
+def _haversine_pairs_numpy(lat1, lon1, lat2, lon2):
+    """Element-wise distance in km between points given in radians; scalars broadcast"""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _haversine_pairs_kernel(lat1, lon1, lat2, lon2, out):
+        for i in prange(lat1.shape[0]):
+            a = np.sin((lat2[i] - lat1[i]) / 2) ** 2 + np.cos(lat1[i]) * np.cos(lat2[i]) * np.sin((lon2[i] - lon1[i]) / 2) ** 2
+            out[i] = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    
+    # Compile at import so the first request does not pay the JIT cost
+    _haversine_pairs_kernel(np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1), np.empty(1))
+
+def _haversine_pairs(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """
+    Element-wise distance in km between equal-length float64 arrays of points
+    in radians. Uses the numba kernel when available, otherwise plain NumPy.
+    """
+    if NUMBA_AVAILABLE:
+        out = np.empty(lat1.shape[0], dtype=np.float64)
+        _haversine_pairs_kernel(lat1, lon1, lat2, lon2, out)
+        return out
+    return _haversine_pairs_numpy(lat1, lon1, lat2, lon2)
+
+def haversine_distances(lat1: float, lon1: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distance in km from one point to an array of points, all in radians"""
+    return _haversine_pairs(np.full(lats.shape[0], lat1), np.full(lons.shape[0], lon1), lats, lons)
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate the great circle distance between two points 
     on the earth (specified in decimal degrees)
     Returns distance in kilometers
     """
-    from math import radians, cos, sin, asin, sqrt
-    
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
+    return float(_haversine_pairs_numpy(radians(lat1), radians(lon1), radians(lat2), radians(lon2)))
+
+def calculate_distance_batch(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """
+    Element-wise great circle distance in km between two arrays of points
+    given in decimal degrees
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    return _haversine_pairs(lat1, lon1, lat2, lon2)
 
 def find_nearest_station(db: Session, latitude: float, longitude: float, max_distance_km: float = 50) -> Optional[Station]:
     """Find the nearest station to given coordinates"""
-    stations = db.query(Station).filter(
-        Station.latitude.isnot(None),
-        Station.longitude.isnot(None)
-    ).all()
+    coords = _get_station_coords(db)
+    if not len(coords["ids"]):
+        return None
     
-    nearest_station = None
-    min_distance = float('inf')
+    distances = haversine_distances(np.radians(latitude), np.radians(longitude), coords["lats"], coords["lons"])
+    nearest = int(np.argmin(distances))
     
-    for station in stations:
-        distance = calculate_distance(latitude, longitude, station.latitude, station.longitude)
-        if distance < min_distance and distance <= max_distance_km:
-            min_distance = distance
-            nearest_station = station
+    if distances[nearest] > max_distance_km:
+        return None
     
-    return nearest_station
+    return db.get(Station, int(coords["ids"][nearest]))
 
 def get_route_between_stations(db: Session, from_station_code: str, to_station_code: str) -> List[Dict[str, Any]]:
     """
     Find the route between two stations
-    Returns list of track segments
+    Returns list of track segments, owned by the caller
     """
-    from_station = db.query(Station).filter(Station.code == from_station_code).first()
-    to_station = db.query(Station).filter(Station.code == to_station_code).first()
+    key = (from_station_code, to_station_code)
+    cached = _route_cache.get(key)
+    if cached is not None and time.monotonic() < cached[0]:
+        _route_cache.move_to_end(key)
+        route = cached[1]
+    else:
+        route = _find_route(db, from_station_code, to_station_code)
+        # No route may only mean its tracks are not announced yet; look again next time
+        if not route:
+            _route_cache.pop(key, None)
+            return route
+        _route_cache[key] = (time.monotonic() + ROUTE_CACHE_TTL_SECONDS, route)
+        _route_cache.move_to_end(key)
+        if len(_route_cache) > ROUTE_CACHE_SIZE:
+            _route_cache.popitem(last=False)
+    return [dict(segment) for segment in route]
+
+def _find_route(db: Session, from_station_code: str, to_station_code: str) -> List[Dict[str, Any]]:
+    station_ids = get_station_ids(db, (from_station_code, to_station_code))
+    from_id = station_ids.get(from_station_code)
+    to_id = station_ids.get(to_station_code)
+    
+    if not from_id or not to_id:
+        return []
+    
+    # Direct tracks in either direction
+    tracks = db.scalars(select(Track).where(
+        tuple_(Track.from_station_id, Track.to_station_id).in_([(from_id, to_id), (to_id, from_id)])
+    )).all()
+    
+    if tracks:
+        return [
+            _route_segment(track, from_station_code, to_station_code, track.from_station_id == from_id)
+            for track in tracks
+        ]
+    
+    # Otherwise walk the network for the fewest-hop route, deepening the
+    # search only while no route is found
+    track_path = None
+    for max_hops in ROUTE_SEARCH_DEPTHS:
+        track_path = db.execute(_MULTI_HOP_ROUTE_SQL, {
+            "src": from_id,
+            "src_visited": f",{from_id},",
+            "dst": to_id,
+            "max_hops": max_hops
+        }).scalar()
+        if track_path:
+            break
     
-    if not from_station or not to_station:
+    if not track_path:
         return []
     
-    # Simple direct route finding - in reality this would use graph algorithms
-    tracks = db.query(Track).filter(
-        ((Track.from_station_id == from_station.id) & (Track.to_station_id == to_station.id)) |
-        ((Track.from_station_id == to_station.id) & (Track.to_station_id == from_station.id))
-    ).all()
+    track_ids = [int(track_id) for track_id in track_path.split(",") if track_id]
+    tracks_by_id = {track.id: track for track in db.scalars(select(Track).where(Track.id.in_(track_ids)))}
+    path_tracks = [tracks_by_id[track_id] for track_id in track_ids]
+    
+    codes = get_station_codes(
+        db, {station_id for track in path_tracks for station_id in (track.from_station_id, track.to_station_id)}
+    )
     
     route = []
-    for track in tracks:
-        route.append({
-            "segment_id": track.segment_id,
-            "from_station": from_station.code if track.from_station_id == from_station.id else to_station.code,
-            "to_station": to_station.code if track.to_station_id == to_station.id else from_station.code,
-            "distance_km": track.distance_km,
-            "max_speed_kmh": track.max_speed_kmh
-        })
+    current_id = from_id
+    for track in path_tracks:
+        forward = track.from_station_id == current_id
+        next_id = track.to_station_id if forward else track.from_station_id
+        route.append(_route_segment(track, codes[current_id], codes[next_id], forward))
+        current_id = next_id
     
     return route
 
+def _route_segment(track: Track, from_code: str, to_code: str, forward: bool) -> Dict[str, Any]:
+    return {
+        "segment_id": track.segment_id,
+        "from_station": from_code if forward else to_code,
+        "to_station": to_code if forward else from_code,
+        "distance_km": track.distance_km,
+        "max_speed_kmh": track.max_speed_kmh
+    }
+
 def estimate_travel_time(distance_km: float, max_speed_kmh: int, train_type: str = "passenger") -> int:
     """
     Estimate travel time in minutes based on distance and train type
@@ -94,36 +309,61 @@ def estimate_travel_time(distance_km: float, max_speed_kmh: int, train_type: str
     total_minutes = (base_time_hours * 60) + buffer_minutes
     return int(total_minutes)
 
+def _parse_timetable_time(value: Any) -> Optional[datetime]:
+    """
+    ISO timestamp as a naive UTC datetime, or None if missing or unparseable.
+    Times with an offset are converted to UTC; naive times are taken as UTC
+    """
+    if not value:
+        return None
+    try:
+        parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 def validate_timetable_consistency(timetable_entries: List[Dict[str, Any]]) -> List[str]:
     """
     Validate timetable entries for consistency
     Returns list of validation errors
     """
     errors = []
+    if not timetable_entries:
+        return errors
+    
+    # Trains numbered in order of first appearance; times compared in bulk
+    train_order = {}
+    trains = np.array([
+        train_order.setdefault(entry.get("train_number"), len(train_order))
+        for entry in timetable_entries
+    ])
+    departures = np.array([_parse_timetable_time(entry.get("departure_time")) for entry in timetable_entries],
+                          dtype="datetime64[us]")
+    arrivals = np.array([_parse_timetable_time(entry.get("arrival_time")) for entry in timetable_entries],
+                        dtype="datetime64[us]")
+    
+    # Entries without both times cannot be ordered; report them and leave them out
+    for field, times in (("departure_time", departures), ("arrival_time", arrivals)):
+        for i in np.flatnonzero(np.isnat(times)):
+            entry = timetable_entries[i]
+            errors.append(f"Train {entry.get('train_number')}: Missing or invalid {field} "
+                          f"at {entry.get('station_code')}")
+    timed = np.flatnonzero(~(np.isnat(departures) | np.isnat(arrivals)))
+    
+    # Order by train, then departure time, so each train's stops are adjacent
+    order = timed[np.lexsort((departures[timed], trains[timed]))]
+    trains, departures, arrivals = trains[order], departures[order], arrivals[order]
+    
+    # A stop is inconsistent if it departs no earlier than the next stop is reached
+    bad = np.flatnonzero((trains[1:] == trains[:-1]) & (departures[:-1] >= arrivals[1:]))
     
-    # Group by train
-    trains = {}
-    for entry in timetable_entries:
-        train_id = entry.get("train_number")
-        if train_id not in trains:
-            trains[train_id] = []
-        trains[train_id].append(entry)
-    
-    for train_id, entries in trains.items():
-        # Sort by departure time
-        entries.sort(key=lambda x: x.get("departure_time", ""))
-        
-        # Check for time consistency
-        for i in range(len(entries) - 1):
-            current = entries[i]
-            next_entry = entries[i + 1]
-            
-            current_dep = datetime.fromisoformat(current.get("departure_time", ""))
-            next_arr = datetime.fromisoformat(next_entry.get("arrival_time", ""))
-            
-            if current_dep >= next_arr:
-                errors.append(f"Train {train_id}: Departure from {current.get('station_code')} "
-                            f"is after arrival at {next_entry.get('station_code')}")
+    for i in bad:
+        current = timetable_entries[order[i]]
+        next_entry = timetable_entries[order[i + 1]]
+        errors.append(f"Train {current.get('train_number')}: Departure from {current.get('station_code')} "
+                    f"is after arrival at {next_entry.get('station_code')}")
     
     return errors
 
@@ -142,17 +382,20 @@ def format_delay_message(delay_minutes: int) -> str:
 
 def generate_train_status_summary(db: Session) -> Dict[str, Any]:
     """Generate a summary of current train statuses"""
-    total_trains = db.query(Train).count()
-    running_trains = db.query(Train).filter(Train.status == "running").count()
-    delayed_trains = db.query(Train).filter(Train.delay_minutes > 5).count()
+    stats = db.execute(select(
+        func.count(Train.id).label("total_trains"),
+        func.count(Train.id).filter(Train.status == "running").label("running_trains"),
+        func.count(Train.id).filter(Train.delay_minutes > 5).label("delayed_trains"),
+        func.avg(Train.delay_minutes).filter(Train.delay_minutes > 0).label("avg_delay")
+    )).one()
     
-    # Calculate average delay
-    trains_with_delay = db.query(Train).filter(Train.delay_minutes > 0).all()
-    avg_delay = sum(t.delay_minutes for t in trains_with_delay) / len(trains_with_delay) if trains_with_delay else 0
+    total_trains = stats.total_trains
+    delayed_trains = stats.delayed_trains
+    avg_delay = float(stats.avg_delay or 0)
     
     return {
         "total_trains": total_trains,
-        "running_trains": running_trains,
+        "running_trains": stats.running_trains,
         "delayed_trains": delayed_trains,
         "on_time_trains": total_trains - delayed_trains,
         "average_delay_minutes": round(avg_delay, 1),
@@ -1,36 +1,74 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import datetime
 
+from src import crud
 from src.app import app
 from src.database import get_db, Base
+from src.models import Train, TimetableEntry
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@pytest.fixture(scope="session")
+def session_factory():
+    # In-memory database with StaticPool so every session shares the one connection
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
 
-Base.metadata.create_all(bind=engine)
+@pytest.fixture(scope="session")
+def client(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+def _upload_stations(client, *codes):
+    response = client.post("/topology", json={
+        "stations": [
+            {"code": code, "name": code, "latitude": 28.0 + i / 10, "longitude": 77.0}
+            for i, code in enumerate(codes)
+        ],
+        "tracks": []
+    })
+    assert response.status_code == 200
 
-app.dependency_overrides[get_db] = override_get_db
+def _position(train_number, current_station=None, **fields):
+    return {
+        "train_number": train_number,
+        "latitude": 28.6,
+        "longitude": 77.2,
+        "speed_kmh": 80.0,
+        "current_station": current_station,
+        "timestamp": "2024-01-01T12:00:00",
+        **fields
+    }
 
-client = TestClient(app)
+def _train(session_factory, train_number):
+    with session_factory() as db:
+        return db.scalars(select(Train).where(Train.train_number == train_number)).one()
 
-def test_root():
+def test_root(client):
     response = client.get("/")
     assert response.status_code == 200
     assert response.json()["message"] == "RailOptima Data Service"
 
-def test_upload_topology():
+def test_upload_topology(client):
     topology_data = {
         "stations": [
             {
@@ -58,10 +96,89 @@ def test_upload_topology():
     assert data["stations_created"] >= 0
     assert data["tracks_created"] >= 0
 
-def test_get_status():
+def test_get_status(client):
     response = client.get("/status")
     assert response.status_code == 200
     data = response.json()
     assert "status" in data
     assert "total_stations" in data
     assert "total_tracks" in data
+
+def test_ingest_positions(client, session_factory):
+    response = client.post("/positions", json=[_position("P100"), _position("P101", status="delayed")])
+    
+    assert response.status_code == 200
+    assert response.json()["message"] == "Updated 2 train positions"
+    assert _train(session_factory, "P101").status == "delayed"
+
+def test_ingest_positions_rejects_invalid_json(client):
+    response = client.post("/positions", content=b"[{", headers={"Content-Type": "application/json"})
+    
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+
+def test_ingest_positions_rejects_invalid_body(client):
+    position = _position("P102")
+    del position["latitude"]
+    
+    response = client.post("/positions", json=[position])
+    
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 0, "latitude"]
+
+def test_position_upsert_keeps_current_station(client, session_factory):
+    _upload_stations(client, "PS1")
+    assert client.post("/positions", json=[_position("P200", current_station="PS1")]).status_code == 200
+    station_id = _train(session_factory, "P200").current_station_id
+    assert station_id is not None
+    
+    # Updates that resolve no station keep the last known one, across and within batches
+    response = client.post("/positions", json=[
+        _position("P200", speed_kmh=40.0),
+        _position("P201", current_station="PS1"),
+        _position("P201", current_station="UNKNOWN", speed_kmh=20.0)
+    ])
+    assert response.status_code == 200
+    
+    updated = _train(session_factory, "P200")
+    assert (updated.speed_kmh, updated.current_station_id) == (40.0, station_id)
+    batched = _train(session_factory, "P201")
+    assert (batched.speed_kmh, batched.current_station_id) == (20.0, station_id)
+
+def test_upload_timetable_in_chunks(client, session_factory, monkeypatch):
+    monkeypatch.setattr(crud, "TIMETABLE_INSERT_CHUNK_SIZE", 2)
+    _upload_stations(client, "TS1", "TS2", "TS3", "TS4", "TS5")
+    entries = [
+        {
+            "train_number": "T300",
+            "station_code": code,
+            "arrival_time": f"2024-01-01T0{i}:00:00",
+            "departure_time": f"2024-01-01T0{i}:05:00",
+            "platform_number": 1
+        }
+        for i, code in enumerate(["TS1", "TS2", "TS3", "TS4", "TS5", "MISSING"])
+    ]
+    
+    response = client.post("/timetable", json={"entries": entries})
+    
+    assert response.status_code == 200
+    train_id = _train(session_factory, "T300").id
+    with session_factory() as db:
+        count = db.scalar(select(func.count(TimetableEntry.id)).where(TimetableEntry.train_id == train_id))
+    # Every entry with a known station, over three INSERTs
+    assert count == 5
+
+def test_metrics(client):
+    client.get("/health")
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE_LATEST
+    families = {family.name: family for family in text_string_to_metric_families(response.text)}
+    assert "http_requests" in families
+    assert any(sample.labels.get("endpoint") == "/health" for sample in families["http_requests"].samples)
+    # LoggingMiddleware is the one place request durations are recorded
+    duration_count = next(sample.value for sample in families["http_request_duration_seconds"].samples
+                          if sample.name == "http_request_duration_seconds_count")
+    assert duration_count >= 1
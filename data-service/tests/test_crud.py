@@ -0,0 +1,66 @@
+import os
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base
+from src.models import Station, Train
+from src.schemas import PositionUpdate
+from src.crud import POSITION_COPY_THRESHOLD, bulk_update_positions
+from src.utils import invalidate_topology_cache
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+@pytest.fixture
+def pg_db():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    invalidate_topology_cache()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    invalidate_topology_cache()
+
+def _position(train_number, **fields):
+    return PositionUpdate(**{
+        "train_number": train_number,
+        "latitude": 28.6,
+        "longitude": 77.2,
+        "speed_kmh": 80.0,
+        "current_station": None,
+        "timestamp": datetime(2024, 1, 1, 12, 0, 0),
+        **fields
+    })
+
+@pytest.mark.postgres
+def test_copy_positions_upserts_through_staging(pg_db):
+    station = Station(code="NDLS", name="New Delhi")
+    pg_db.add(station)
+    pg_db.flush()
+    pg_db.add(Train(train_number="T0", train_type="express", status="running", current_station_id=station.id))
+    pg_db.commit()
+    
+    positions = [_position(f"T{i}") for i in range(POSITION_COPY_THRESHOLD)]
+    positions[0] = _position("T0", status="", speed_kmh=12.5)
+    positions[1] = _position("T1", status="tab\there", current_station="NDLS")
+    
+    assert bulk_update_positions(pg_db, positions) == POSITION_COPY_THRESHOLD
+    
+    trains = {train.train_number: train for train in pg_db.scalars(select(Train))}
+    assert len(trains) == POSITION_COPY_THRESHOLD
+    # Existing train: updated in place, empty status kept as '', station carried forward
+    assert trains["T0"].train_type == "express"
+    assert trains["T0"].status == ""
+    assert trains["T0"].speed_kmh == 12.5
+    assert trains["T0"].current_station_id == station.id
+    # New trains
+    assert trains["T1"].status == "tab\there"
+    assert trains["T1"].current_station_id == station.id
+    assert trains["T2"].current_station_id is None
+    assert trains["T2"].last_updated == datetime(2024, 1, 1, 12, 0, 0)
@@ -1,10 +1,56 @@
+import numpy as np
 import pytest
-from src.utils import calculate_distance, estimate_travel_time, validate_timetable_consistency
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src import utils
+from src.database import Base
+from src.models import Station, Track
+from src.utils import (
+    calculate_distance, calculate_distance_batch, haversine_distances, estimate_travel_time,
+    validate_timetable_consistency,
+    get_station_ids, get_station_codes, get_route_between_stations, find_nearest_station,
+    invalidate_topology_cache
+)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    invalidate_topology_cache()
+    yield session
+    session.close()
+    engine.dispose()
+    invalidate_topology_cache()
+
+def _add_line(db, codes):
+    """Stations with the given codes joined in order by tracks, written without invalidating the caches"""
+    stations = {code: Station(code=code, name=code) for code in codes}
+    db.add_all(stations.values())
+    db.flush()
+    db.add_all(
+        Track(segment_id=f"{a}-{b}", from_station_id=stations[a].id, to_station_id=stations[b].id, distance_km=10.0)
+        for a, b in zip(codes, codes[1:])
+    )
+    db.commit()
+    return {code: station.id for code, station in stations.items()}
 
 def test_calculate_distance():
-    # Distance between New Delhi and Ghaziabad (approximately 46 km)
+    # Great circle distance between New Delhi and Ghaziabad stations; the
+    # line between them is longer (about 46 km)
     distance = calculate_distance(28.6448, 77.2097, 28.6692, 77.4538)
-    assert 40 <= distance <= 50  # Allow some tolerance
+    assert distance == pytest.approx(23.97, abs=0.01)
+
+def test_distance_batches_match_scalar():
+    lats = np.array([28.6448, 28.6692, 26.8467])
+    lons = np.array([77.2097, 77.4538, 80.9462])
+    expected = [calculate_distance(28.6448, 77.2097, lat, lon) for lat, lon in zip(lats, lons)]
+    
+    assert calculate_distance_batch(np.full(3, 28.6448), np.full(3, 77.2097), lats, lons) == pytest.approx(expected)
+    assert haversine_distances(np.radians(28.6448), np.radians(77.2097), np.radians(lats), np.radians(lons)) == pytest.approx(expected)
 
 def test_estimate_travel_time():
     # Test express train
@@ -53,3 +99,166 @@ def test_validate_timetable_consistency():
     
     errors = validate_timetable_consistency(invalid_entries)
     assert len(errors) > 0
+
+def test_validate_timetable_missing_times():
+    entries = [
+        {
+            "train_number": "12004",
+            "station_code": "NDLS",
+            "departure_time": "",
+            "arrival_time": "2024-01-01T06:00:00"
+        },
+        {
+            "train_number": "12004",
+            "station_code": "GZB",
+            "departure_time": "2024-01-01T07:00:00",
+            "arrival_time": "2024-01-01T06:45:00"
+        },
+        {
+            "train_number": "12004",
+            "station_code": "MB",
+            "departure_time": "2024-01-01T09:00:00"
+        }
+    ]
+    
+    # Each bad entry is reported once and no ordering error is made up around it
+    assert validate_timetable_consistency(entries) == [
+        "Train 12004: Missing or invalid departure_time at NDLS",
+        "Train 12004: Missing or invalid arrival_time at MB",
+    ]
+
+def test_validate_timetable_utc_offsets(recwarn):
+    entries = [
+        {
+            "train_number": "12004",
+            "station_code": "NDLS",
+            "departure_time": "2024-01-01T06:00:00+05:30",
+            "arrival_time": "2024-01-01T06:00:00+05:30"
+        },
+        {
+            # 00:40 UTC, 10 minutes after leaving NDLS
+            "train_number": "12004",
+            "station_code": "GZB",
+            "departure_time": "2024-01-01T00:45:00+00:00",
+            "arrival_time": "2024-01-01T00:40:00Z"
+        }
+    ]
+    assert validate_timetable_consistency(entries) == []
+    
+    # Times without an offset are UTC: GZB at 00:20 is reached before NDLS is left at 00:30
+    entries[1]["arrival_time"] = "2024-01-01T00:20:00"
+    entries[1]["departure_time"] = "2024-01-01T06:45:00"
+    assert validate_timetable_consistency(entries) == [
+        "Train 12004: Departure from NDLS is after arrival at GZB"
+    ]
+    assert not recwarn.list
+
+def test_station_created_elsewhere_is_found(db):
+    _add_line(db, ["A", "B"])
+    assert set(get_station_ids(db)) == {"A", "B"}
+    
+    # Another worker creates C while this process's map is still fresh
+    station_id = _add_line(db, ["C"])["C"]
+    assert "C" not in get_station_ids(db)
+    
+    assert get_station_ids(db, ["C", None, "UNKNOWN"])["C"] == station_id
+    assert get_station_codes(db, [station_id])[station_id] == "C"
+
+def test_route_through_station_newer_than_cache(db):
+    ids = _add_line(db, ["A", "B"])
+    get_station_ids(db)
+    
+    c = Station(code="C", name="C")
+    db.add(c)
+    db.flush()
+    db.add(Track(segment_id="B-C", from_station_id=ids["B"], to_station_id=c.id, distance_km=10.0))
+    db.commit()
+    
+    route = get_route_between_stations(db, "A", "C")
+    assert [(segment["from_station"], segment["to_station"]) for segment in route] == [("A", "B"), ("B", "C")]
+
+def _hops(route):
+    return [(segment["from_station"], segment["to_station"]) for segment in route]
+
+def test_route_cache_returns_copies(db):
+    _add_line(db, ["A", "B", "C"])
+    route = get_route_between_stations(db, "A", "C")
+    route[0]["from_station"] = "X"
+    route.clear()
+    
+    assert _hops(get_route_between_stations(db, "A", "C")) == [("A", "B"), ("B", "C")]
+
+def test_route_cache_skips_missing_routes(db):
+    ids = _add_line(db, ["A", "B", "C"])
+    assert get_route_between_stations(db, "A", "D") == []
+    
+    d = Station(code="D", name="D")
+    db.add(d)
+    db.flush()
+    db.add(Track(segment_id="C-D", from_station_id=ids["C"], to_station_id=d.id, distance_km=10.0))
+    db.commit()
+    
+    assert _hops(get_route_between_stations(db, "A", "D")) == [("A", "B"), ("B", "C"), ("C", "D")]
+
+def test_route_cache_expires(db, monkeypatch):
+    clock = SimpleNamespace(monotonic=lambda: 0.0)
+    monkeypatch.setattr(utils, "time", clock)
+    ids = _add_line(db, ["A", "B", "C"])
+    assert len(get_route_between_stations(db, "A", "C")) == 2
+    
+    db.add(Track(segment_id="A-C", from_station_id=ids["A"], to_station_id=ids["C"], distance_km=15.0))
+    db.commit()
+    assert len(get_route_between_stations(db, "A", "C")) == 2
+    
+    clock.monotonic = lambda: utils.ROUTE_CACHE_TTL_SECONDS + 1.0
+    assert _hops(get_route_between_stations(db, "A", "C")) == [("A", "C")]
+
+def test_multi_hop_route_beyond_first_search_depth(db):
+    codes = ["A", "B", "C", "D", "E", "F"]
+    _add_line(db, codes)
+    
+    route = get_route_between_stations(db, "A", "F")
+    
+    assert _hops(route) == list(zip(codes, codes[1:]))
+
+def test_route_takes_fewest_hops(db):
+    ids = _add_line(db, ["A", "B", "C", "D"])
+    x = Station(code="X", name="X")
+    db.add(x)
+    db.flush()
+    db.add_all([
+        Track(segment_id="A-X", from_station_id=ids["A"], to_station_id=x.id, distance_km=30.0),
+        Track(segment_id="X-D", from_station_id=x.id, to_station_id=ids["D"], distance_km=30.0)
+    ])
+    db.commit()
+    
+    assert _hops(get_route_between_stations(db, "A", "D")) == [("A", "X"), ("X", "D")]
+
+def test_find_nearest_station(db):
+    db.add_all([
+        Station(code="NDLS", name="New Delhi", latitude=28.6448, longitude=77.2097),
+        Station(code="GZB", name="Ghaziabad", latitude=28.6692, longitude=77.4538),
+        Station(code="NONE", name="No coordinates")
+    ])
+    db.commit()
+    
+    assert find_nearest_station(db, 28.66, 77.40).code == "GZB"
+    assert find_nearest_station(db, 28.64, 77.22).code == "NDLS"
+    # Lucknow is beyond the default 50 km of either station
+    assert find_nearest_station(db, 26.8467, 80.9462) is None
+    assert find_nearest_station(db, 26.8467, 80.9462, max_distance_km=500).code == "GZB"
+
+def test_nearest_station_cache_expires(db, monkeypatch):
+    clock = SimpleNamespace(monotonic=lambda: 0.0)
+    monkeypatch.setattr(utils, "time", clock)
+    db.add(Station(code="NDLS", name="New Delhi", latitude=28.6448, longitude=77.2097))
+    db.commit()
+    assert find_nearest_station(db, 28.66, 77.40).code == "NDLS"
+    
+    # Another worker adds GZB; this process sees it once the cached coordinates expire
+    db.add(Station(code="GZB", name="Ghaziabad", latitude=28.6692, longitude=77.4538))
+    db.commit()
+    assert find_nearest_station(db, 28.66, 77.40).code == "NDLS"
+    
+    clock.monotonic = lambda: utils.STATION_CACHE_TTL_SECONDS + 1.0
+    assert find_nearest_station(db, 28.66, 77.40).code == "GZB"
@@ -1,5 +1,5 @@
 from ortools.sat.python import cp_model
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime, timedelta
 import logging
 
@@ -7,34 +7,109 @@ from .schemas import TrainData, TrackData
 
 logger = logging.getLogger(__name__)
 
+# Default planning horizon in one-minute slots (4 hours)
+DEFAULT_TIME_HORIZON = 240
+
+# Line speed available in each weather condition, in percent
+WEATHER_SPEED_PERCENT = {
+    'heavy_rain': 70,
+    'fog': 50,
+    'snow': 60,
+    'high_wind': 80,
+    'normal': 100
+}
+
+def travel_minutes(distance_km: float, speed_kmh: float) -> int:
+    """Whole minutes, rounded up, to cover distance_km at speed_kmh
+    
+    Distance and speed are quantized to tenths once and the rest is
+    integer arithmetic, so every restriction path rounds the same way.
+    """
+    distance_x10 = round(distance_km * 10)
+    speed_x10 = max(round(speed_kmh * 10), 1)
+    return -(-distance_x10 * 60 // speed_x10)
+
+def restriction_delay_minutes(track: TrackData, restricted_speed_kmh: float) -> int:
+    """Extra occupation minutes when the track runs at restricted_speed_kmh; 0 without a track distance"""
+    if track.distance_km is None:
+        return 0
+    return max(travel_minutes(track.distance_km, restricted_speed_kmh)
+               - travel_minutes(track.distance_km, track.max_speed_kmh), 0)
+
+def weather_delay_minutes(track: TrackData, speed_percent: int) -> int:
+    """Extra occupation minutes when weather cuts line speed to speed_percent"""
+    return restriction_delay_minutes(track, track.max_speed_kmh * speed_percent / 100)
+
 class AdvancedConstraintBuilder:
-    """Builder for complex railway-specific constraints"""
+    """Builder for complex railway-specific constraints
+    
+    The add_*_constraints methods work on the time-indexed occupancy grid
+    x[train_id][track_id][t]. The interval methods below them expect one
+    occupation interval per (train, track), intervals[train_id][track_id],
+    and express the same rules with NoOverlap instead of per-slot constraints;
+    RailwayOptimizer applies a request's NetworkConditions through them.
+    """
     
-    def __init__(self, model: cp_model.CpModel):
+    def __init__(self, model: cp_model.CpModel, time_horizon: int = DEFAULT_TIME_HORIZON):
         self.model = model
+        self.time_horizon = time_horizon
+        self.time_slots = range(time_horizon)
+        self._indexed_tracks = None
+        self._track_by_id: Dict[str, TrackData] = {}
+        self._tracks_by_station: Dict[str, List[TrackData]] = {}
+        self._track_by_stations: Dict[Tuple[str, str], TrackData] = {}
+        self._indexed_occupancy = None
+        self._trains_on_track: Dict[str, List[Tuple[TrainData, Dict]]] = {}
+    
+    def _index_tracks(self, tracks: List[TrackData]):
+        """Build segment and station lookups once per tracks list"""
+        if self._indexed_tracks is tracks:
+            return
+        self._indexed_tracks = tracks
+        self._track_by_id = {track.segment_id: track for track in tracks}
+        self._tracks_by_station = {}
+        self._track_by_stations = {}
+        for track in tracks:
+            self._tracks_by_station.setdefault(track.from_station, []).append(track)
+            if track.to_station != track.from_station:
+                self._tracks_by_station.setdefault(track.to_station, []).append(track)
+            self._track_by_stations.setdefault((track.from_station, track.to_station), track)
+            self._track_by_stations.setdefault((track.to_station, track.from_station), track)
+    
+    def _occupancy_on_track(self, trains: List[TrainData], x: Dict, track_id: str) -> List[Tuple[TrainData, Dict]]:
+        """(train, x[train_id][track_id]) for every train that can occupy the track"""
+        indexed = self._indexed_occupancy
+        if indexed is None or indexed[0] is not trains or indexed[1] is not x:
+            self._indexed_occupancy = (trains, x)
+            self._trains_on_track = {}
+            for train in trains:
+                for occupied_track, slots in x.get(train.train_id, {}).items():
+                    self._trains_on_track.setdefault(occupied_track, []).append((train, slots))
+        return self._trains_on_track.get(track_id, [])
         
     def add_junction_constraints(self, trains: List[TrainData], tracks: List[TrackData], 
                                x: Dict, junction_tracks: Dict[str, List[str]]):
         """Add constraints for railway junctions"""
-        time_slots = range(240)  # Assuming 4-hour horizon
+        time_slots = self.time_slots
         
         for junction_id, track_list in junction_tracks.items():
+            # Occupancy slots of every train that can use the junction, filtered once
+            relevant = [
+                slots
+                for track_id in track_list
+                for _, slots in self._occupancy_on_track(trains, x, track_id)
+            ]
+            if not relevant:
+                continue
+            
             for t in time_slots:
                 # At most one train can cross junction at any time
-                junction_occupancy = []
-                
-                for track_id in track_list:
-                    for train in trains:
-                        if track_id in x[train.train_id]:
-                            junction_occupancy.append(x[train.train_id][track_id][t])
-                
-                if junction_occupancy:
-                    self.model.Add(sum(junction_occupancy) <= 1)
+                self.model.AddAtMostOne(slots[t] for slots in relevant)
     
     def add_signal_constraints(self, trains: List[TrainData], tracks: List[TrackData], 
                              x: Dict, signals: Dict[str, Dict]):
         """Add signal-based movement constraints"""
-        time_slots = range(240)
+        time_slots = self.time_slots
         
         for signal_id, signal_data in signals.items():
             controlled_tracks = signal_data.get('controlled_tracks', [])
@@ -42,17 +117,19 @@ class AdvancedConstraintBuilder:
             
             if signal_type == 'manual':
                 # Manual signals require explicit clearance
-                for track_id in controlled_tracks:
-                    for train in trains:
-                        if track_id in x[train.train_id]:
-                            # Add signal clearance variables
-                            for t in time_slots:
-                                signal_clear = self.model.NewBoolVar(f"signal_clear_{signal_id}_{t}")
-                                # Train can only occupy if signal is clear
-                                self.model.AddImplication(
-                                    x[train.train_id][track_id][t],
-                                    signal_clear
-                                )
+                occupants = [
+                    slots
+                    for track_id in controlled_tracks
+                    for _, slots in self._occupancy_on_track(trains, x, track_id)
+                ]
+                if not occupants:
+                    continue
+                
+                # One clearance variable per slot, shared by every controlled occupancy
+                for t in time_slots:
+                    signal_clear = self.model.NewBoolVar(f"signal_clear_{signal_id}_{t}")
+                    # Train can only occupy if signal is clear: not clear => nobody occupies
+                    self.model.AddBoolAnd([slots[t].Not() for slots in occupants]).OnlyEnforceIf(signal_clear.Not())
     
     def add_maintenance_window_constraints(self, trains: List[TrainData], tracks: List[TrackData],
                                          x: Dict, maintenance_windows: List[Dict]):
@@ -62,133 +139,250 @@ class AdvancedConstraintBuilder:
             start_time = window['start_minute']
             end_time = window['end_minute']
             
-            # No trains allowed during maintenance
-            for train in trains:
-                if track_id in x[train.train_id]:
-                    for t in range(start_time, min(end_time + 1, 240)):
-                        self.model.Add(x[train.train_id][track_id][t] == 0)
+            # No trains allowed during maintenance; fix the domains instead of
+            # adding one equality per slot
+            for _, slots in self._occupancy_on_track(trains, x, track_id):
+                for t in range(start_time, min(end_time + 1, self.time_horizon)):
+                    slots[t].Proto().domain[:] = [0, 0]
+    
+    def _add_minimum_occupation(self, slots: Dict, min_slots: int, name: str):
+        """If a train enters the track at t, it occupies slots t..t+min_slots"""
+        horizon = self.time_horizon
+        for t in range(horizon - min_slots):
+            starting = self.model.NewBoolVar(f"{name}_{t}")
+            
+            literals = [slots[t + dt] for dt in range(min(min_slots + 1, horizon - t))]
+            if t > 0:
+                literals.append(slots[t - 1].Not())
+                # starting <=> (not x[t-1] and x[t]), so an entry cannot skip the chain
+                self.model.AddBoolOr([slots[t - 1], slots[t].Not(), starting])
+            else:
+                self.model.AddImplication(slots[t], starting)
+            self.model.AddBoolAnd(literals).OnlyEnforceIf(starting)
     
     def add_speed_restriction_constraints(self, trains: List[TrainData], tracks: List[TrackData],
                                         x: Dict, speed_restrictions: Dict[str, int]):
         """Add constraints for temporary speed restrictions"""
         # This affects travel time calculations
+        self._index_tracks(tracks)
         for track_id, restricted_speed in speed_restrictions.items():
-            track = next((t for t in tracks if t.segment_id == track_id), None)
+            track = self._track_by_id.get(track_id)
             if not track:
                 continue
             
             # Calculate increased travel time due to speed restriction
-            normal_time = (track.distance_km / track.max_speed_kmh) * 60  # minutes
-            restricted_time = (track.distance_km / restricted_speed) * 60
-            additional_time = int(restricted_time - normal_time)
+            additional_time = restriction_delay_minutes(track, restricted_speed)
             
             # Extend minimum occupation time for affected trains
-            for train in trains:
-                if track_id in x[train.train_id]:
-                    # Add constraint that train must occupy track for at least additional_time
-                    for t in range(240 - additional_time):
-                        # If train starts occupying at time t, it must continue for additional_time
-                        starting = self.model.NewBoolVar(f"starting_{train.train_id}_{track_id}_{t}")
-                        
-                        if t > 0:
-                            self.model.Add(x[train.train_id][track_id][t - 1] == 0).OnlyEnforceIf(starting)
-                        self.model.Add(x[train.train_id][track_id][t] == 1).OnlyEnforceIf(starting)
-                        
-                        # Must continue occupying for minimum time
-                        for dt in range(1, min(additional_time + 1, 240 - t)):
-                            self.model.Add(x[train.train_id][track_id][t + dt] == 1).OnlyEnforceIf(starting)
+            for train, slots in self._occupancy_on_track(trains, x, track_id):
+                # Add constraint that train must occupy track for at least additional_time
+                self._add_minimum_occupation(slots, additional_time, f"starting_{train.train_id}_{track_id}")
     
     def add_crew_change_constraints(self, trains: List[TrainData], x: Dict, 
-                                  crew_change_stations: Set[str]):
+                                  crew_change_stations: Set[str],
+                                  tracks: Optional[List[TrackData]] = None):
         """Add constraints for mandatory crew changes"""
+        # Add minimum stop time constraint (e.g., 10 minutes)
+        min_stop_time = 10
+        
+        if tracks is not None:
+            self._index_tracks(tracks)
+            station_tracks = {
+                station: [track.segment_id for track in self._tracks_by_station.get(station, [])]
+                for station in crew_change_stations
+            }
+        else:
+            # Without track data, fall back to "FROM-TO" segment ids
+            segment_ids = {track_id for x_train in x.values() for track_id in x_train}
+            station_tracks = {
+                station: [track_id for track_id in segment_ids if station in track_id.split("-")]
+                for station in crew_change_stations
+            }
+        
+        route_sets = {train.train_id: frozenset(train.route) for train in trains}
+        
+        for station, track_ids in station_tracks.items():
+            for train in trains:
+                if station not in route_sets[train.train_id]:
+                    continue
+                
+                # Train must stop at crew change station for minimum time
+                x_train = x[train.train_id]
+                for track_id in track_ids:
+                    slots = x_train.get(track_id)
+                    if slots is None:
+                        continue
+                    for t in range(self.time_horizon - min_stop_time):
+                        stopping = self.model.NewBoolVar(f"crew_change_{train.train_id}_{station}_{t}")
+                        
+                        # If stopping for crew change, must occupy for minimum time
+                        self.model.AddBoolAnd([slots[t + dt] for dt in range(min_stop_time)]).OnlyEnforceIf(stopping)
+    
+    def train_time_windows(self, trains: List[TrainData], tracks: List[TrackData],
+                           base_time: datetime) -> Dict[str, Dict[str, Tuple[int, int]]]:
+        """
+        train_id -> track_id -> (earliest, latest) slot the train can occupy a
+        route track: it reaches the track no sooner than its scheduled time plus
+        the minimum running time of the tracks before it, and leaves it early
+        enough to run the rest of its route inside the horizon. Tracks without
+        a distance count as zero running time, which only widens the window
+        """
+        self._index_tracks(tracks)
+        last_slot = self.time_horizon - 1
+        windows = {}
         for train in trains:
-            for station in crew_change_stations:
-                if station in train.route:
-                    # Train must stop at crew change station for minimum time
-                    station_tracks = [track_id for track_id in x[train.train_id] 
-                                    if station in track_id]  # Simplified station-track mapping
-                    
-                    for track_id in station_tracks:
-                        # Add minimum stop time constraint (e.g., 10 minutes)
-                        min_stop_time = 10
-                        for t in range(240 - min_stop_time):
-                            stopping = self.model.NewBoolVar(f"crew_change_{train.train_id}_{station}_{t}")
-                            
-                            # If stopping for crew change, must occupy for minimum time
-                            for dt in range(min_stop_time):
-                                if t + dt < 240:
-                                    self.model.Add(x[train.train_id][track_id][t + dt] == 1).OnlyEnforceIf(stopping)
+            route_tracks = [
+                self._track_by_stations[pair]
+                for pair in zip(train.route, train.route[1:])
+                if pair in self._track_by_stations
+            ]
+            running = [
+                travel_minutes(track.distance_km, track.max_speed_kmh) if track.distance_km is not None else 0
+                for track in route_tracks
+            ]
+            
+            earliest = max(int((train.scheduled_arrival - base_time).total_seconds() // 60), 0)
+            remaining = sum(running)
+            train_windows: Dict[str, Tuple[int, int]] = {}
+            for track, minutes in zip(route_tracks, running):
+                remaining -= minutes
+                window = (earliest, last_slot - remaining)
+                if track.segment_id in train_windows:
+                    # A route that passes the track twice can be there in either window
+                    previous = train_windows[track.segment_id]
+                    window = (min(previous[0], window[0]), max(previous[1], window[1]))
+                train_windows[track.segment_id] = window
+                earliest += minutes
+            windows[train.train_id] = train_windows
+        return windows
     
     def add_priority_overtaking_constraints(self, trains: List[TrainData], tracks: List[TrackData],
-                                          x: Dict, overtaking_stations: Set[str]):
-        """Add constraints for priority-based overtaking"""
-        time_slots = range(240)
+                                          x: Dict, overtaking_stations: Set[str],
+                                          time_windows: Optional[Dict[str, Dict[str, Tuple[int, int]]]] = None):
+        """
+        Add constraints for priority-based overtaking
+        
+        time_windows, as returned by train_time_windows, fixes each train's
+        station-track slots outside its window to 0, so the capacity constraint
+        of a slot only needs the trains that can be there
+        """
+        time_slots = self.time_slots
+        full_window = (0, self.time_horizon - 1)
+        time_windows = time_windows or {}
         
         # Sort trains by priority (1 = highest priority)
         sorted_trains = sorted(trains, key=lambda t: t.priority)
+        route_sets = {train.train_id: frozenset(train.route) for train in trains}
+        seen_tracks = set()
+        self._index_tracks(tracks)
         
         for station in overtaking_stations:
-            # Find tracks associated with this station
-            station_tracks = [track for track in tracks 
-                            if station in track.from_station or station in track.to_station]
-            
-            for track in station_tracks:
-                for i, high_priority_train in enumerate(sorted_trains):
-                    for j, low_priority_train in enumerate(sorted_trains[i+1:], i+1):
-                        if (track.segment_id in x[high_priority_train.train_id] and 
-                            track.segment_id in x[low_priority_train.train_id]):
-                            
-                            # High priority train gets preference
-                            for t in time_slots:
-                                # If both trains want the track, high priority gets it
-                                both_want_track = self.model.NewBoolVar(
-                                    f"both_want_{high_priority_train.train_id}_{low_priority_train.train_id}_{track.segment_id}_{t}"
-                                )
-                                
-                                # This is a simplified constraint - real implementation would be more complex
-                                self.model.AddImplication(
-                                    both_want_track,
-                                    x[high_priority_train.train_id][track.segment_id][t]
-                                )
-                                self.model.AddImplication(
-                                    both_want_track,
-                                    x[low_priority_train.train_id][track.segment_id][t].Not()
-                                )
+            # Tracks starting or ending at this station
+            for track in self._tracks_by_station.get(station, []):
+                if track.segment_id in seen_tracks:
+                    continue
+                seen_tracks.add(track.segment_id)
+                
+                # Only trains routed through the station can compete for it
+                occupants = [
+                    (time_windows.get(train.train_id, {}).get(track.segment_id, full_window), slots)
+                    for train, slots in self._occupancy_on_track(sorted_trains, x, track.segment_id)
+                    if not route_sets[train.train_id].isdisjoint((track.from_station, track.to_station))
+                ]
+                for (earliest, latest), slots in occupants:
+                    for t in time_slots:
+                        if t < earliest or t > latest:
+                            slots[t].Proto().domain[:] = [0, 0]
+                if len(occupants) <= track.capacity:
+                    continue
+                
+                priority_order = []
+                for t in time_slots:
+                    # At most capacity trains on the station track at a time, among those that can be there at t
+                    slot_vars = [slots[t] for (earliest, latest), slots in occupants if earliest <= t <= latest]
+                    if len(slot_vars) <= track.capacity:
+                        continue
+                    self.model.Add(sum(slot_vars) <= track.capacity)
+                    priority_order.extend(slot_vars)
+                
+                # Branch on higher-priority trains first within each slot
+                if priority_order:
+                    self.model.AddDecisionStrategy(priority_order, cp_model.CHOOSE_FIRST, cp_model.SELECT_MAX_VALUE)
     
     def add_weather_impact_constraints(self, trains: List[TrainData], tracks: List[TrackData],
                                      x: Dict, weather_conditions: Dict[str, str]):
         """Add constraints for weather impact on operations"""
-        weather_speed_factors = {
-            'heavy_rain': 0.7,
-            'fog': 0.5,
-            'snow': 0.6,
-            'high_wind': 0.8,
-            'normal': 1.0
-        }
-        
+        self._index_tracks(tracks)
         for track_id, weather in weather_conditions.items():
-            speed_factor = weather_speed_factors.get(weather, 1.0)
+            speed_percent = WEATHER_SPEED_PERCENT.get(weather, 100)
             
-            if speed_factor < 1.0:
-                track = next((t for t in tracks if t.segment_id == track_id), None)
+            if speed_percent < 100:
+                track = self._track_by_id.get(track_id)
                 if not track:
                     continue
                 
                 # Calculate increased travel time
-                normal_time = (track.distance_km / track.max_speed_kmh) * 60
-                weather_time = normal_time / speed_factor
-                additional_time = int(weather_time - normal_time)
+                additional_time = weather_delay_minutes(track, speed_percent)
                 
                 # Similar to speed restriction constraints
-                for train in trains:
-                    if track_id in x[train.train_id]:
-                        for t in range(240 - additional_time):
-                            starting = self.model.NewBoolVar(f"weather_start_{train.train_id}_{track_id}_{t}")
-                            
-                            if t > 0:
-                                self.model.Add(x[train.train_id][track_id][t - 1] == 0).OnlyEnforceIf(starting)
-                            self.model.Add(x[train.train_id][track_id][t] == 1).OnlyEnforceIf(starting)
-                            
-                            # Extended occupation due to weather
-                            for dt in range(1, min(additional_time + 1, 240 - t)):
-                                self.model.Add(x[train.train_id][track_id][t + dt] == 1).OnlyEnforceIf(starting)
+                for train, slots in self._occupancy_on_track(trains, x, track_id):
+                    # Extended occupation due to weather
+                    self._add_minimum_occupation(slots, additional_time, f"weather_start_{train.train_id}_{track_id}")
+    
+    def add_junction_no_overlap(self, intervals: Dict[str, Dict[str, cp_model.IntervalVar]],
+                                junction_tracks: Dict[str, List[str]]):
+        """At most one train inside a junction at any time"""
+        for junction_id, track_list in junction_tracks.items():
+            junction_intervals = [
+                train_intervals[track_id]
+                for train_intervals in intervals.values()
+                for track_id in track_list
+                if track_id in train_intervals
+            ]
+            if len(junction_intervals) > 1:
+                self.model.AddNoOverlap(junction_intervals)
+    
+    def add_maintenance_window_intervals(self, intervals: Dict[str, Dict[str, cp_model.IntervalVar]],
+                                         maintenance_windows: List[Dict]):
+        """Keep train occupations out of fixed maintenance intervals"""
+        windows_by_track: Dict[str, List[cp_model.IntervalVar]] = {}
+        for i, window in enumerate(maintenance_windows):
+            start_time = window['start_minute']
+            end_time = min(window['end_minute'], self.time_horizon - 1)
+            if end_time < start_time:
+                continue
+            windows_by_track.setdefault(window['track_id'], []).append(
+                self.model.NewFixedSizedIntervalVar(
+                    start_time, end_time - start_time + 1, f"maintenance_{window['track_id']}_{i}"
+                )
+            )
+        
+        # Per train, so trains sharing a multi-capacity track are not serialized
+        for train_intervals in intervals.values():
+            for track_id, windows in windows_by_track.items():
+                if track_id in train_intervals:
+                    self.model.AddNoOverlap([train_intervals[track_id]] + windows)
+    
+    def occupation_extensions(self, tracks: List[TrackData], speed_restrictions: Dict[str, int],
+                              weather_conditions: Dict[str, str]) -> Dict[str, int]:
+        """
+        Extra occupation minutes per segment from speed restrictions and weather,
+        to be added to the interval size when the occupation intervals are built
+        """
+        self._index_tracks(tracks)
+        extensions: Dict[str, int] = {}
+        
+        for track_id, restricted_speed in speed_restrictions.items():
+            track = self._track_by_id.get(track_id)
+            if not track:
+                continue
+            extensions[track_id] = extensions.get(track_id, 0) + restriction_delay_minutes(track, restricted_speed)
+        
+        for track_id, weather in weather_conditions.items():
+            speed_percent = WEATHER_SPEED_PERCENT.get(weather, 100)
+            track = self._track_by_id.get(track_id)
+            if speed_percent >= 100 or not track:
+                continue
+            extensions[track_id] = extensions.get(track_id, 0) + weather_delay_minutes(track, speed_percent)
+        
+        return extensions
@@ -1,11 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from pydantic import ValidationError
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import List, Dict, Any, Optional
+import asyncio
 import logging
+import multiprocessing
 import os
+import threading
 
 from .schemas import ScheduleRequest, ScheduleResponse, OptimizationResult
-from .optimizer import RailwayOptimizer
+from .optimizer import RailwayOptimizer, OptimizationConfig, InfeasibleScheduleError
 
 app = FastAPI(
     title="RailOptima Optimization Engine",
@@ -28,27 +35,129 @@ logger = logging.getLogger(__name__)
 
 # Initialize optimizer
 SOLVER_TYPE = os.getenv("SOLVER_TYPE", "ortools")  # ortools or gurobi
-optimizer = RailwayOptimizer(solver_type=SOLVER_TYPE)
+optimizer_config = OptimizationConfig(
+    max_solve_time_seconds=int(os.getenv("SOLVER_MAX_TIME_SECONDS", "30")),
+    num_search_workers=int(os.getenv("SOLVER_WORKERS", "0")) or os.cpu_count() or 8,
+    relative_gap_limit=float(os.getenv("SOLVER_RELATIVE_GAP", "0.05")),
+    log_search_progress=os.getenv("SOLVER_LOG_SEARCH", "").lower() in ("1", "true", "yes")
+)
+optimizer = RailwayOptimizer(solver_type=SOLVER_TYPE, config=optimizer_config)
+
+# Solves run in worker processes so the event loop stays free; CP-SAT threads
+# are split between them instead of every process using all cores. Each
+# worker has its own optimizer, so the model cache and the last solution used
+# as a hint are per process: a repeat request only hits them when it lands on
+# the same worker, and hit rates drop as OPTIMIZER_PROCESSES grows
+OPTIMIZER_PROCESSES = int(os.getenv("OPTIMIZER_PROCESSES", "0")) or max(1, (os.cpu_count() or 2) // 2)
+executor: Optional[ProcessPoolExecutor] = None
+_worker_optimizer: Optional[RailwayOptimizer] = None
+
+# Serializes solves on the app's own optimizer, which is not thread-safe
+_optimizer_lock = threading.Lock()
+
+def _init_worker(solver_type: str, config: OptimizationConfig):
+    global _worker_optimizer
+    _worker_optimizer = RailwayOptimizer(solver_type=solver_type, config=config)
+
+def _run_optimization(trains, tracks, conflicts, time_horizon, warm_start, conditions) -> OptimizationResult:
+    return _worker_optimizer.optimize(
+        trains=trains,
+        tracks=tracks,
+        conflicts=conflicts,
+        time_horizon=time_horizon,
+        warm_start=warm_start,
+        conditions=conditions
+    )
+
+def _run_in_process(trains, tracks, conflicts, time_horizon, warm_start, conditions) -> OptimizationResult:
+    """Solve on the app's optimizer, for when no worker pool is running"""
+    with _optimizer_lock:
+        return optimizer.optimize(
+            trains=trains,
+            tracks=tracks,
+            conflicts=conflicts,
+            time_horizon=time_horizon,
+            warm_start=warm_start,
+            conditions=conditions
+        )
+
+@app.on_event("startup")
+def start_executor():
+    global executor
+    worker_config = replace(
+        optimizer_config,
+        num_search_workers=max(1, optimizer_config.num_search_workers // OPTIMIZER_PROCESSES)
+    )
+    # spawn rather than fork: the server already has threads running
+    executor = ProcessPoolExecutor(
+        max_workers=OPTIMIZER_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(SOLVER_TYPE, worker_config)
+    )
+
+@app.on_event("shutdown")
+def stop_executor():
+    global executor
+    if executor is not None:
+        pool, executor = executor, None
+        pool.shutdown(wait=False, cancel_futures=True)
 
 @app.get("/")
 async def root():
     return {"message": "RailOptima Optimization Engine", "version": "1.0.0", "solver": SOLVER_TYPE}
 
-@app.post("/schedule", response_model=ScheduleResponse)
-async def optimize_schedule(request: ScheduleRequest):
+def _inline_schema_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the local $defs of a model JSON schema so it can sit inside the OpenAPI document"""
+    defs = schema.pop("$defs", {})
+    
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+    
+    return resolve(schema)
+
+async def parse_schedule_request(http_request: Request) -> ScheduleRequest:
+    """Decode and validate the raw body in one pass through pydantic-core"""
+    try:
+        return ScheduleRequest.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+@app.post(
+    "/schedule",
+    response_model=ScheduleResponse,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": _inline_schema_refs(ScheduleRequest.model_json_schema())}}
+    }}
+)
+async def optimize_schedule(request: ScheduleRequest = Depends(parse_schedule_request)):
     """
     Optimize railway schedule based on current positions, delays, and priorities
     """
     try:
         logger.info(f"Received optimization request for {len(request.trains)} trains")
         
-        # Run optimization
-        result = optimizer.optimize(
-            trains=request.trains,
-            tracks=request.tracks,
-            conflicts=request.conflicts,
-            time_horizon=request.time_horizon_minutes,
-            warm_start=request.warm_start_solution
+        # Run optimization in a worker process; outside the app's lifespan
+        # (no pool yet, or already shut down) solve in a thread on this process
+        pool = executor
+        result = await asyncio.get_running_loop().run_in_executor(
+            pool,
+            _run_optimization if pool is not None else _run_in_process,
+            request.trains,
+            request.tracks,
+            request.conflicts,
+            request.time_horizon_minutes,
+            request.warm_start_solution,
+            request.conditions
         )
         
         logger.info(f"Optimization completed. Objective value: {result.objective_value}")
@@ -62,6 +171,15 @@ async def optimize_schedule(request: ScheduleRequest):
             total_delay_minutes=result.total_delay_minutes
         )
         
+    except InfeasibleScheduleError as e:
+        logger.warning(f"Infeasible schedule request: {e.conflicting_constraints}")
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "conflicting_constraints": e.conflicting_constraints}
+        )
+    except ValueError as e:
+        logger.warning(f"Rejected optimization request: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Optimization failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
@@ -1,39 +1,170 @@
 from ortools.sat.python import cp_model
 import numpy as np
 from typing import List, Dict, Optional, Tuple, Set
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime
 import logging
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from enum import Enum
 
-from .schemas import TrainData, TrackData, ConflictData, ScheduleEntry, OptimizationResult
+from .schemas import TrainData, TrackData, ConflictData, ScheduleEntry, OptimizationResult, NetworkConditions
+from .advanced_constraints import AdvancedConstraintBuilder
 
 logger = logging.getLogger(__name__)
 
+# Topologies whose lookup tables are kept between optimize() calls
+TOPOLOGY_CACHE_SIZE = 32
+# Built CP-SAT models kept for re-solving structurally identical requests
+MODEL_CACHE_SIZE = 16
+# Platform numbers available at every station
+MAX_PLATFORMS = 10
+
 class ConflictType(Enum):
     TRACK_OCCUPATION = "track_occupation"
     PLATFORM_CONFLICT = "platform_conflict"
     JUNCTION_CROSSING = "junction_crossing"
     HEADWAY_VIOLATION = "headway_violation"
 
+class InfeasibleScheduleError(Exception):
+    """No schedule satisfies the request; carries the tags of a conflicting constraint set"""
+    
+    def __init__(self, conflicting_constraints: List[str]):
+        super().__init__(conflicting_constraints)
+        self.conflicting_constraints = conflicting_constraints
+    
+    def __str__(self):
+        return f"No feasible schedule; conflicting constraints: {', '.join(self.conflicting_constraints) or 'unknown'}"
+
+@dataclass
+class TopologyIndex:
+    """Track lookups that depend only on the network, reused across requests"""
+    track_by_id: Dict[str, TrackData]
+    segment_by_stations: Dict[Tuple[str, str], str]
+    # Station route -> resolved segment ids; dispatch re-optimizes the same routes
+    route_segments: Dict[Tuple[str, ...], List[str]] = field(default_factory=dict)
+    # Variable name -> value from the last successful solve on this network
+    last_solution: Optional[Dict[str, int]] = None
+
+def _topology_fingerprint(tracks: List[TrackData]) -> Tuple:
+    return tuple(
+        (track.segment_id, track.from_station, track.to_station, track.capacity, track.headway_minutes,
+         track.distance_km, track.max_speed_kmh)
+        for track in tracks
+    )
+
+@dataclass
+class SegmentTable:
+    """Flat view of the variables read back after solving, one row per (train, route segment)"""
+    # (train_id, segment_id) per row
+    keys: List[Tuple[str, str]]
+    # int64 (rows, 3): start, end and first-station platform variable
+    # indices; -1 when the train has no platform variable
+    columns: np.ndarray
+    # int64 variable indices of each train's start delay and journey time,
+    # in request order
+    delay_index: np.ndarray
+    journey_index: np.ndarray
+
+@dataclass
+class CachedModel:
+    """A built model plus the handles needed to re-solve it with new start times"""
+    model: cp_model.CpModel
+    variables: Dict
+    intervals: Dict
+    # constraint index -> tag, see RailwayOptimizer._diagnosable
+    assumptions: Dict[int, str]
+    # train_id -> scheduled start constraint, whose constant is updated in place
+    start_constraints: Dict[str, cp_model.Constraint]
+    segment_table: SegmentTable
+
+def _conditions_fingerprint(conditions: Optional[NetworkConditions]) -> Optional[Tuple]:
+    if conditions is None:
+        return None
+    return (
+        tuple((junction_id, tuple(track_ids)) for junction_id, track_ids in conditions.junctions.items()),
+        tuple((window.track_id, window.start_minute, window.end_minute) for window in conditions.maintenance_windows),
+        tuple(conditions.speed_restrictions.items()),
+        tuple(conditions.weather_conditions.items()),
+    )
+
+def _model_fingerprint(trains: List[TrainData], tracks: List[TrackData], config: "OptimizationConfig",
+                       conditions: Optional[NetworkConditions] = None) -> Tuple:
+    """
+    Everything the model structure depends on. Scheduled start times,
+    priorities and objective weights are excluded: they are written into a
+    cached model on reuse. Conflicts add nothing to the model
+    """
+    return (
+        tuple((train.train_id, tuple(train.route), train.scheduled_arrival is None) for train in trains),
+        _topology_fingerprint(tracks),
+        (config.time_horizon_minutes, config.headway_buffer_minutes, config.min_segment_minutes),
+        _conditions_fingerprint(conditions),
+    )
+
+def _minutes_from(base_time: np.datetime64, times: List[Optional[datetime]]) -> np.ndarray:
+    """Whole minutes from base_time to each of times (NaT for None), in one datetime64 operation"""
+    return np.array(times, dtype='datetime64[m]') - base_time
+
+class _SearchProgress(cp_model.CpSolverSolutionCallback):
+    """
+    Counts and logs each improving solution. Stopping at the gap is left to
+    the solver's relative_gap_limit parameter
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.solutions = 0
+    
+    def on_solution_callback(self):
+        self.solutions += 1
+        if logger.isEnabledFor(logging.DEBUG):
+            objective = self.ObjectiveValue()
+            gap = abs(objective - self.BestObjectiveBound()) / max(1.0, abs(objective))
+            logger.debug(f"Solution {self.solutions} at {self.WallTime():.2f}s: objective {objective}, gap {gap:.3f}")
+
 @dataclass
 class OptimizationConfig:
     time_horizon_minutes: int = 240
-    time_step_minutes: int = 1
     max_solve_time_seconds: int = 30
     delay_weight: float = 1.0
     conflict_weight: float = 100.0
     priority_multiplier: float = 2.0
     headway_buffer_minutes: int = 2
+    min_segment_minutes: int = 1
+    num_search_workers: int = field(default_factory=lambda: os.cpu_count() or 8)
+    # Stop once the incumbent is within this fraction of the best bound
+    relative_gap_limit: float = 0.05
+    log_search_progress: bool = False
 
 class RailwayOptimizer:
     def __init__(self, solver_type: str = "ortools", config: OptimizationConfig = None):
         self.solver_type = solver_type
         self.config = config or OptimizationConfig()
         self.model = None
-        self.solver = None
+        # Kept across solves so repeat requests reuse the same solver object
+        self.solver = cp_model.CpSolver()
         self.variables = {}
         self.constraints = []
+        # Constraint index -> tag of the request-dependent constraints that
+        # are turned into assumptions to explain an infeasible model
+        self.assumptions: Dict[int, str] = {}
+        self.topology: Optional[TopologyIndex] = None
+        self._topology_tracks: Optional[List[TrackData]] = None
+        self._topology_cache: "OrderedDict[Tuple, TopologyIndex]" = OrderedDict()
+        self.intervals = {}
+        self.start_constraints: Dict[str, cp_model.Constraint] = {}
+        self.segment_table: Optional[SegmentTable] = None
+        # Values of the last feasible solve, indexed by variable index
+        self.solution_values: Optional[np.ndarray] = None
+        # Time origin of the current request (the minute it started) and each
+        # train's scheduled start in minutes from it
+        self.base_time: Optional[np.datetime64] = None
+        self.scheduled_starts: Dict[str, Optional[int]] = {}
+        self._request_trains: Optional[List[TrainData]] = None
+        # Built models by structure; like the topologies' last_solution, only
+        # shared by requests solved on this optimizer (this process)
+        self._model_cache: "OrderedDict[Tuple, CachedModel]" = OrderedDict()
         
     def is_ready(self) -> bool:
         return True
@@ -44,26 +175,30 @@ class RailwayOptimizer:
         tracks: List[TrackData],
         conflicts: List[ConflictData],
         time_horizon: int = 240,
-        warm_start: Optional[List[ScheduleEntry]] = None
+        warm_start: Optional[List[ScheduleEntry]] = None,
+        conditions: Optional[NetworkConditions] = None
     ) -> OptimizationResult:
         """
         Main optimization method using CP-SAT solver with advanced constraints
         """
+        if not trains:
+            raise ValueError("At least one train is required")
+        
         start_time = datetime.now()
+        self._begin_request(trains)
         logger.info(f"Starting optimization for {len(trains)} trains, {len(tracks)} tracks")
         
         # Update configuration
         self.config.time_horizon_minutes = time_horizon
         
-        # Create and solve model
-        model = self._create_model(trains, tracks, conflicts)
+        # Create (or reuse) and solve model
+        model = self._get_model(trains, tracks, conditions)
         solution = self._solve_model(model, warm_start)
         
         solve_time = (datetime.now() - start_time).total_seconds()
         
         if solution:
-            schedule = self._extract_schedule(solution, trains, tracks)
-            metrics = self._calculate_metrics(solution, trains, conflicts)
+            schedule, metrics = self._extract_all(solution, trains, tracks, conflicts)
             
             return OptimizationResult(
                 schedule=schedule,
@@ -75,393 +210,610 @@ class RailwayOptimizer:
         else:
             raise Exception("Optimization failed - no feasible solution found")
     
-    def _create_model(self, trains: List[TrainData], tracks: List[TrackData], 
-                     conflicts: List[ConflictData]) -> cp_model.CpModel:
+    def _get_topology(self, tracks: List[TrackData]) -> TopologyIndex:
+        """Return the lookup tables for this track set, building them on first use"""
+        if self._topology_tracks is tracks:
+            return self.topology
+        
+        key = _topology_fingerprint(tracks)
+        topology = self._topology_cache.get(key)
+        if topology is not None:
+            self._topology_cache.move_to_end(key)
+            self.topology, self._topology_tracks = topology, tracks
+            return topology
+        
+        segment_by_stations = {}
+        for track in tracks:
+            # First matching track wins, in either direction
+            segment_by_stations.setdefault((track.from_station, track.to_station), track.segment_id)
+            segment_by_stations.setdefault((track.to_station, track.from_station), track.segment_id)
+        
+        topology = TopologyIndex(
+            track_by_id={track.segment_id: track for track in tracks},
+            segment_by_stations=segment_by_stations
+        )
+        self._topology_cache[key] = topology
+        if len(self._topology_cache) > TOPOLOGY_CACHE_SIZE:
+            self._topology_cache.popitem(last=False)
+        self.topology, self._topology_tracks = topology, tracks
+        return topology
+    
+    def _begin_request(self, trains: List[TrainData]):
+        """Fix the request's time origin and convert every scheduled start to minutes from it"""
+        self.base_time = np.datetime64(datetime.now().replace(second=0, microsecond=0), 'm')
+        offsets = _minutes_from(self.base_time, [train.scheduled_arrival for train in trains])
+        self.scheduled_starts = {
+            train.train_id: None if missing else minutes
+            for train, minutes, missing in zip(trains, offsets.astype(np.int64).tolist(), np.isnat(offsets).tolist())
+        }
+        self._request_trains = trains
+    
+    def _get_model(self, trains: List[TrainData], tracks: List[TrackData],
+                   conditions: Optional[NetworkConditions] = None) -> cp_model.CpModel:
+        """Return a model for this request, re-solving a cached build when only its inputs changed"""
+        key = _model_fingerprint(trains, tracks, self.config, conditions)
+        cached = self._model_cache.get(key)
+        if cached is None:
+            model = self._create_model(trains, tracks, conditions)
+            self._model_cache[key] = CachedModel(
+                model, self.variables, self.intervals, self.assumptions, self.start_constraints,
+                self.segment_table
+            )
+            if len(self._model_cache) > MODEL_CACHE_SIZE:
+                self._model_cache.popitem(last=False)
+            return model
+        
+        self._model_cache.move_to_end(key)
+        self._get_topology(tracks)
+        self.variables = cached.variables
+        self.intervals = cached.intervals
+        self.assumptions = cached.assumptions
+        self.start_constraints = cached.start_constraints
+        self.segment_table = cached.segment_table
+        
+        # start - delay == earliest start: only the constant moves between requests
+        for train in trains:
+            constraint = self.start_constraints.get(train.train_id)
+            if constraint is not None:
+                earliest_start = max(self._get_scheduled_start_minutes(train), 0)
+                constraint.Proto().linear.domain[:] = [earliest_start, earliest_start]
+        
+        # Priorities only weight the objective; Minimize replaces it
+        variables = self.variables
+        self._set_objective(cached.model, trains, variables['s'], variables['j'])
+        logger.info("Reusing cached model")
+        return cached.model
+    
+    def _create_model(self, trains: List[TrainData], tracks: List[TrackData],
+                     conditions: Optional[NetworkConditions] = None) -> cp_model.CpModel:
         """Create the constraint programming model"""
         model = cp_model.CpModel()
+        if self._request_trains is not trains:
+            self._begin_request(trains)
         self.variables = {}
+        self.intervals = {}
+        self.assumptions = {}
+        self.start_constraints = {}
+        self._get_topology(tracks)
+        
+        horizon = self.config.time_horizon_minutes
+        min_segment = self.config.min_segment_minutes
+        
+        # Stations of each route, deduplicated in route order
+        stations = {train.train_id: tuple(dict.fromkeys(train.route)) for train in trains}
         
-        # Time discretization
-        time_slots = range(self.config.time_horizon_minutes)
+        # Speed restrictions and weather lengthen the minimum occupation of a segment
+        builder = AdvancedConstraintBuilder(model, time_horizon=horizon)
+        extensions = {}
+        if conditions is not None:
+            extensions = builder.occupation_extensions(tracks, conditions.speed_restrictions,
+                                                       conditions.weather_conditions)
         
         # Decision Variables
         
-        # 1. Train-Track-Time occupancy: x[train_id][track_id][time] = 1 if train occupies track at time
-        x = {}
+        # 1. Segment occupation: one interval per (train, segment on its route),
+        #    start[train_id][segment_id] <= t < end[train_id][segment_id], lasting size minutes
+        start = {}
+        size = {}
+        end = {}
+        intervals = {}
+        windows = {}
         for train in trains:
-            x[train.train_id] = {}
-            for track in tracks:
-                x[train.train_id][track.segment_id] = {}
-                for t in time_slots:
-                    x[train.train_id][track.segment_id][t] = model.NewBoolVar(
-                        f"occupy_{train.train_id}_{track.segment_id}_{t}"
-                    )
+            start[train.train_id] = {}
+            size[train.train_id] = {}
+            end[train.train_id] = {}
+            intervals[train.train_id] = {}
+            windows[train.train_id] = self._compute_time_windows(train, tracks, extensions)
+            for segment_id, (earliest_start, latest_end) in windows[train.train_id].items():
+                name = f"{train.train_id}_{segment_id}"
+                min_size = min_segment + extensions.get(segment_id, 0)
+                seg_start = model.NewIntVar(earliest_start, latest_end - min_size, f"start_{name}")
+                seg_size = model.NewIntVar(min_size, latest_end - earliest_start, f"size_{name}")
+                seg_end = model.NewIntVar(earliest_start + min_size, latest_end, f"end_{name}")
+                start[train.train_id][segment_id] = seg_start
+                size[train.train_id][segment_id] = seg_size
+                end[train.train_id][segment_id] = seg_end
+                intervals[train.train_id][segment_id] = model.NewIntervalVar(
+                    seg_start, seg_size, seg_end, f"occupy_{name}"
+                )
         
         # 2. Start delay variables: s[train_id] = delay in minutes from scheduled start
         s = {}
         for train in trains:
             max_delay = min(120, self.config.time_horizon_minutes // 2)  # Max 2 hours delay
-            s[train.train_id] = model.NewIntVar(0, max_delay, f"start_delay_{train.train_id}")
-        
-        # 3. Conflict occurrence: c[conflict_id] = 1 if conflict occurs
-        c = {}
-        for conflict in conflicts:
-            c[conflict.conflict_id] = model.NewBoolVar(f"conflict_{conflict.conflict_id}")
+            # No delay can push the first segment past its latest start
+            latest_slack = max(horizon - len(windows[train.train_id]) * min_segment, 0)
+            s[train.train_id] = model.NewIntVar(0, min(max_delay, latest_slack), f"start_delay_{train.train_id}")
         
-        # 4. Platform assignment: p[train_id][station_id] = platform number
+        # 3. Platform assignment: p[train_id][station_id] = platform number
         p = {}
         for train in trains:
             p[train.train_id] = {}
-            for station_code in set(train.route):
-                # Assume max 10 platforms per station
-                p[train.train_id][station_code] = model.NewIntVar(1, 10, f"platform_{train.train_id}_{station_code}")
+            for station_code in stations[train.train_id]:
+                # Assume max MAX_PLATFORMS platforms per station
+                p[train.train_id][station_code] = model.NewIntVar(1, MAX_PLATFORMS, f"platform_{train.train_id}_{station_code}")
         
-        # 5. Journey completion time: j[train_id] = time when train completes journey
+        # 4. Journey completion time: j[train_id] = time when train completes journey
         j = {}
         for train in trains:
-            j[train.train_id] = model.NewIntVar(0, self.config.time_horizon_minutes, f"journey_time_{train.train_id}")
+            earliest_completion = min(len(windows[train.train_id]) * min_segment, horizon)
+            j[train.train_id] = model.NewIntVar(earliest_completion, horizon, f"journey_time_{train.train_id}")
         
-        self.variables = {'x': x, 's': s, 'c': c, 'p': p, 'j': j}
+        self.variables = {'start': start, 'size': size, 'end': end, 's': s, 'p': p, 'j': j}
+        self.intervals = intervals
+        self.segment_table = self._build_segment_table(trains)
         
         # Add Constraints
-        self._add_capacity_constraints(model, trains, tracks, x)
-        self._add_route_continuity_constraints(model, trains, tracks, x)
-        self._add_headway_constraints(model, trains, tracks, x)
-        self._add_platform_constraints(model, trains, p)
-        self._add_conflict_constraints(model, trains, tracks, conflicts, x, c)
-        self._add_timing_constraints(model, trains, x, s, j)
+        # Capacity and headway share one resource constraint per track: the
+        # headway-extended intervals also bound plain occupancy
+        blocks = self._headway_intervals(model, trains, start, size, end, intervals)
+        self._add_capacity_constraints(model, trains, tracks, blocks)
+        self._add_route_continuity_constraints(model, trains, start, end)
+        self._add_platform_constraints(model, trains, p, start, end)
+        self._add_timing_constraints(model, trains, start, end, s, j)
+        if conditions is not None:
+            builder.add_junction_no_overlap(intervals, conditions.junctions)
+            builder.add_maintenance_window_intervals(
+                intervals, [window.model_dump() for window in conditions.maintenance_windows]
+            )
         
         # Set Objective
-        self._set_objective(model, trains, conflicts, s, c, j)
+        self._set_objective(model, trains, s, j)
+        
+        proto = model.Proto()
+        logger.info(f"Model built: {len(proto.variables)} variables, {len(proto.constraints)} constraints, "
+                    f"{len(self.assumptions)} diagnosable")
         
         return model
     
+    def _compute_time_windows(self, train: TrainData, tracks: List[TrackData],
+                              extensions: Optional[Dict[str, int]] = None) -> Dict[str, Tuple[int, int]]:
+        """
+        segment_id -> (earliest start, latest end) reachable from the train's
+        route position, given each segment takes at least min_segment_minutes
+        plus its occupation extension
+        """
+        horizon = self.config.time_horizon_minutes
+        min_segment = self.config.min_segment_minutes
+        extensions = extensions or {}
+        segments = list(dict.fromkeys(self._get_route_segments(train, tracks)))
+        durations = [min_segment + extensions.get(segment_id, 0) for segment_id in segments]
+        
+        windows = {}
+        earliest_start = 0
+        remaining = sum(durations)
+        for segment_id, duration in zip(segments, durations):
+            remaining -= duration
+            latest_end = horizon - remaining
+            # Routes longer than the horizon keep a non-empty domain and fail
+            # on the horizon bound of the journey time instead
+            windows[segment_id] = (earliest_start, max(latest_end, earliest_start + duration))
+            earliest_start += duration
+        return windows
+    
+    def _diagnosable(self, constraint: cp_model.Constraint, tag: str) -> cp_model.Constraint:
+        """
+        Register a request-dependent constraint; if the model is infeasible,
+        _infeasibility_core reports which of these conflict
+        """
+        self.assumptions[constraint.Index()] = tag
+        return constraint
+    
+    def _infeasibility_core(self, model: cp_model.CpModel) -> List[str]:
+        """
+        Tags of a conflicting subset of the diagnosable constraints. CP-SAT
+        only computes an exact assumption core for a feasibility model on one
+        worker without presolve, so this runs once, after the normal solve has
+        proved infeasibility, on a copy without the objective that enforces
+        each constraint by an assumption literal
+        """
+        diagnosis = model.Clone()
+        diagnosis.ClearObjective()
+        constraints = diagnosis.Proto().constraints
+        literals = {}
+        for index, tag in self.assumptions.items():
+            literal = diagnosis.NewBoolVar(f"assume_{tag}")
+            constraints[index].enforcement_literal.append(literal.Index())
+            literals[literal.Index()] = (literal, tag)
+        diagnosis.AddAssumptions([literal for literal, _ in literals.values()])
+        
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = 1
+        solver.parameters.cp_model_presolve = False
+        solver.parameters.max_time_in_seconds = self.config.max_solve_time_seconds
+        if solver.Solve(diagnosis) != cp_model.INFEASIBLE:
+            return []
+        return [literals[index][1] for index in solver.SufficientAssumptionsForInfeasibility() if index in literals]
+    
+    def _track_occupations(self, trains: List[TrainData], tracks: List[TrackData], 
+                           variables: Dict) -> Dict[str, List]:
+        """segment_id -> per-train entries of variables[train_id][segment_id]"""
+        on_track = {track.segment_id: [] for track in tracks}
+        for train in trains:
+            for segment_id, var in variables[train.train_id].items():
+                on_track[segment_id].append(var)
+        return on_track
+    
     def _add_capacity_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
-                                tracks: List[TrackData], x: Dict):
-        """Add track capacity constraints"""
-        time_slots = range(self.config.time_horizon_minutes)
+                                tracks: List[TrackData], intervals: Dict):
+        """Add track capacity constraints (including headway, via the block intervals)"""
+        on_track = self._track_occupations(trains, tracks, intervals)
         
         for track in tracks:
-            for t in time_slots:
-                # Track capacity constraint: sum of trains on track <= capacity
-                occupancy_vars = []
-                for train in trains:
-                    if track.segment_id in x[train.train_id]:
-                        occupancy_vars.append(x[train.train_id][track.segment_id][t])
-                
-                if occupancy_vars:
-                    model.Add(sum(occupancy_vars) <= track.capacity)
+            # Track capacity constraint: trains blocking the track at any time <= capacity
+            track_intervals = on_track[track.segment_id]
+            if len(track_intervals) <= track.capacity:
+                continue
+            
+            if track.capacity == 1:
+                model.AddNoOverlap(track_intervals)
+            else:
+                model.AddCumulative(track_intervals, [1] * len(track_intervals), track.capacity)
     
     def _add_route_continuity_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
-                                        tracks: List[TrackData], x: Dict):
+                                        start: Dict, end: Dict):
         """Add constraints for route continuity and train movement"""
-        time_slots = range(self.config.time_horizon_minutes)
-        
         for train in trains:
-            route_segments = self._get_route_segments(train, tracks)
-            
-            if len(route_segments) < 2:
-                continue
-            
-            # Sequential segment occupation
-            for i in range(len(route_segments) - 1):
-                current_segment = route_segments[i]
-                next_segment = route_segments[i + 1]
-                
-                for t in range(len(time_slots) - 1):
-                    # If train leaves current segment at time t, it must enter next segment at t+1
-                    if (current_segment in x[train.train_id] and 
-                        next_segment in x[train.train_id]):
-                        
-                        # Leaving current segment
-                        leaving_current = model.NewBoolVar(f"leaving_{train.train_id}_{current_segment}_{t}")
-                        model.Add(x[train.train_id][current_segment][t] == 1).OnlyEnforceIf(leaving_current)
-                        model.Add(x[train.train_id][current_segment][t + 1] == 0).OnlyEnforceIf(leaving_current)
-                        
-                        # Must enter next segment
-                        model.Add(x[train.train_id][next_segment][t + 1] == 1).OnlyEnforceIf(leaving_current)
+            route_segments = list(start[train.train_id])
             
-            # Train must complete its route
-            if route_segments:
-                last_segment = route_segments[-1]
-                if last_segment in x[train.train_id]:
-                    # Train must occupy last segment at some point
-                    model.Add(sum(x[train.train_id][last_segment][t] for t in time_slots) >= 1)
+            # Sequential segment occupation: the train enters the next segment as it leaves the current one
+            for current_segment, next_segment in zip(route_segments, route_segments[1:]):
+                model.Add(start[train.train_id][next_segment] == end[train.train_id][current_segment])
     
-    def _add_headway_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
-                               tracks: List[TrackData], x: Dict):
-        """Add minimum headway constraints between trains"""
-        time_slots = range(self.config.time_horizon_minutes)
+    def _headway_intervals(self, model: cp_model.CpModel, trains: List[TrainData], 
+                           start: Dict, size: Dict, end: Dict, intervals: Dict) -> Dict:
+        """Occupation intervals extended by the minimum headway between trains"""
         headway = self.config.headway_buffer_minutes + 3  # Base headway + buffer
+        if headway <= 0:
+            return intervals
         
-        for track in tracks:
-            for i, train1 in enumerate(trains):
-                for j, train2 in enumerate(trains):
-                    if i >= j:  # Avoid duplicate constraints
-                        continue
-                    
-                    if (track.segment_id in x[train1.train_id] and 
-                        track.segment_id in x[train2.train_id]):
-                        
-                        for t in range(len(time_slots) - headway):
-                            # If train1 occupies at time t, train2 cannot occupy for headway period
-                            for h in range(1, headway + 1):
-                                if t + h < len(time_slots):
-                                    model.AddImplication(
-                                        x[train1.train_id][track.segment_id][t],
-                                        x[train2.train_id][track.segment_id][t + h].Not()
-                                    )
-    
-    def _add_platform_constraints(self, model: cp_model.CpModel, trains: List[TrainData], p: Dict):
-        """Add platform assignment constraints"""
-        # Group trains by station and time windows
-        station_trains = {}
-        
+        # Each occupation blocks its segment for a further headway minutes
+        # after the train leaves it
+        blocks = {}
         for train in trains:
-            for station in train.route:
-                if station not in station_trains:
-                    station_trains[station] = []
-                station_trains[station].append(train)
-        
-        # Platform conflict constraints
-        for station, station_train_list in station_trains.items():
-            for i, train1 in enumerate(station_train_list):
-                for j, train2 in enumerate(station_train_list):
-                    if i >= j:
-                        continue
-                    
-                    # If trains are at station simultaneously, they need different platforms
-                    if (train1.train_id in p and station in p[train1.train_id] and
-                        train2.train_id in p and station in p[train2.train_id]):
-                        
-                        # This is a simplified constraint - in reality, you'd need time overlap detection
-                        same_platform = model.NewBoolVar(f"same_platform_{train1.train_id}_{train2.train_id}_{station}")
-                        model.Add(p[train1.train_id][station] == p[train2.train_id][station]).OnlyEnforceIf(same_platform)
-                        model.Add(p[train1.train_id][station] != p[train2.train_id][station]).OnlyEnforceIf(same_platform.Not())
-                        
-                        # If trains overlap in time at station, they cannot use same platform
-                        # This would require more complex time overlap detection in practice
+            blocks[train.train_id] = {}
+            for segment_id, seg_start in start[train.train_id].items():
+                blocks[train.train_id][segment_id] = model.NewIntervalVar(
+                    seg_start, size[train.train_id][segment_id] + headway,
+                    end[train.train_id][segment_id] + headway,
+                    f"headway_{train.train_id}_{segment_id}"
+                )
+        return blocks
     
-    def _add_conflict_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
-                                tracks: List[TrackData], conflicts: List[ConflictData], 
-                                x: Dict, c: Dict):
-        """Add conflict detection and resolution constraints"""
-        time_slots = range(self.config.time_horizon_minutes)
+
+    def _station_visits(self, train: TrainData, start: Dict, end: Dict) -> List[Tuple[str, cp_model.IntVar]]:
+        """
+        (station, arrival) along the route for every station next to one of
+        the train's segments: the origin is left at the start of the first
+        segment, and every later station is reached as a segment ends
+        """
+        segment_by_stations = self.topology.segment_by_stations
+        train_start = start[train.train_id]
+        visits = []
+        arrival = None  # end of the segment that reached the current station
+        for station, next_station in zip(train.route, train.route[1:]):
+            segment_id = segment_by_stations.get((station, next_station))
+            if segment_id is None or segment_id not in train_start:
+                if arrival is not None:
+                    visits.append((station, arrival))
+                arrival = None
+                continue
+            # Continuity makes this start the previous segment's end as well
+            visits.append((station, train_start[segment_id]))
+            arrival = end[train.train_id][segment_id]
+        if arrival is not None:
+            visits.append((train.route[-1], arrival))
+        return visits
+    
+    def _add_platform_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
+                                p: Dict, start: Dict, end: Dict):
+        """
+        Add platform assignment constraints: each station visit holds its
+        platform for min_segment_minutes from the solved arrival, as one optional
+        interval per platform, and the visits on a platform cannot overlap
+        """
+        dwell = self.config.min_segment_minutes
+        visits_by_station = {}
+        for train in trains:
+            for station, arrival in self._station_visits(train, start, end):
+                visits_by_station.setdefault(station, []).append((train.train_id, arrival))
         
-        for conflict in conflicts:
-            if conflict.conflict_type == ConflictType.TRACK_OCCUPATION.value:
-                # Track occupation conflict
-                conflict_trains = conflict.train_ids
-                resource_id = conflict.resource_id
-                
-                # Find the track
-                track = next((t for t in tracks if t.segment_id == resource_id), None)
-                if not track:
-                    continue
-                
-                for t in time_slots:
-                    # Count trains occupying the resource
-                    occupancy_vars = []
-                    for train_id in conflict_trains:
-                        if (train_id in x and resource_id in x[train_id]):
-                            occupancy_vars.append(x[train_id][resource_id][t])
-                    
-                    if len(occupancy_vars) > 1:
-                        # Conflict occurs if more than capacity trains occupy resource
-                        total_occupancy = sum(occupancy_vars)
-                        
-                        # No conflict if occupancy <= capacity
-                        model.Add(total_occupancy <= track.capacity).OnlyEnforceIf(c[conflict.conflict_id].Not())
-                        
-                        # Conflict if occupancy > capacity
-                        model.Add(total_occupancy >= track.capacity + 1).OnlyEnforceIf(c[conflict.conflict_id])
+        platforms = range(1, MAX_PLATFORMS + 1)
+        for station, visits in visits_by_station.items():
+            if len({train_id for train_id, _ in visits}) < 2:
+                continue
+            
+            on_platform = {platform: [] for platform in platforms}
+            for i, (train_id, arrival) in enumerate(visits):
+                name = f"{train_id}_{station}_{i}"
+                here = [model.NewBoolVar(f"on_platform_{name}_{platform}") for platform in platforms]
+                model.AddExactlyOne(here)
+                model.Add(p[train_id][station] == cp_model.LinearExpr.WeightedSum(here, list(platforms)))
+                for platform, present in zip(platforms, here):
+                    on_platform[platform].append(
+                        model.NewOptionalFixedSizedIntervalVar(arrival, dwell, present, f"at_platform_{name}_{platform}")
+                    )
+            
+            # Time-overlapping visits, however delayed, need different platforms
+            for platform_visits in on_platform.values():
+                model.AddNoOverlap(platform_visits)
     
     def _add_timing_constraints(self, model: cp_model.CpModel, trains: List[TrainData], 
-                              x: Dict, s: Dict, j: Dict):
+                              start: Dict, end: Dict, s: Dict, j: Dict):
         """Add timing and scheduling constraints"""
-        time_slots = range(self.config.time_horizon_minutes)
-        
         for train in trains:
-            # Journey completion time constraint
-            route_segments = self._get_route_segments_from_train(train)
+            route_segments = list(start[train.train_id])
+            if not route_segments:
+                continue
             
-            if route_segments:
-                last_segment = route_segments[-1]
-                if last_segment in x[train.train_id]:
-                    # Journey completion time is when train exits last segment
-                    for t in time_slots:
-                        # If train is in last segment at time t but not at t+1, journey completes at t+1
-                        if t < len(time_slots) - 1:
-                            completing = model.NewBoolVar(f"completing_{train.train_id}_{t}")
-                            model.Add(x[train.train_id][last_segment][t] == 1).OnlyEnforceIf(completing)
-                            model.Add(x[train.train_id][last_segment][t + 1] == 0).OnlyEnforceIf(completing)
-                            model.Add(j[train.train_id] == t + 1).OnlyEnforceIf(completing)
+            # Journey completion time is when train exits last segment
+            model.Add(j[train.train_id] == end[train.train_id][route_segments[-1]])
             
-            # Start delay constraint - train cannot start before its scheduled time + delay
+            # Start delay constraint - train enters its first segment at its scheduled time + delay
             scheduled_start_minutes = self._get_scheduled_start_minutes(train)
             if scheduled_start_minutes is not None:
-                # First segment occupation must be after scheduled start + delay
-                route_segments = self._get_route_segments_from_train(train)
-                if route_segments:
-                    first_segment = route_segments[0]
-                    if first_segment in x[train.train_id]:
-                        for t in time_slots:
-                            if t < scheduled_start_minutes:
-                                model.Add(x[train.train_id][first_segment][t] == 0)
-                            elif t >= scheduled_start_minutes:
-                                # Can start at scheduled time + delay
-                                can_start = model.NewBoolVar(f"can_start_{train.train_id}_{t}")
-                                model.Add(t >= scheduled_start_minutes + s[train.train_id]).OnlyEnforceIf(can_start)
+                earliest_start = max(scheduled_start_minutes, 0)
+                self.start_constraints[train.train_id] = self._diagnosable(
+                    model.Add(start[train.train_id][route_segments[0]] - s[train.train_id] == earliest_start),
+                    f"scheduled_start:{train.train_id}"
+                )
     
-    def _set_objective(self, model: cp_model.CpModel, trains: List[TrainData], 
-                      conflicts: List[ConflictData], s: Dict, c: Dict, j: Dict):
-        """Set the optimization objective"""
-        objective_terms = []
+    def _set_objective(self, model: cp_model.CpModel, trains: List[TrainData], s: Dict, j: Dict):
+        """
+        Set the optimization objective. Conflicts carry no penalty: track
+        capacity is a hard constraint, so a schedule cannot keep one
+        """
+        config = self.config
+        priorities = np.array([train.priority for train in trains], dtype=np.float64)
         
-        # 1. Minimize delays (weighted by priority)
-        for train in trains:
-            priority_weight = self.config.delay_weight * (6 - train.priority) * self.config.priority_multiplier
-            objective_terms.append(priority_weight * s[train.train_id])
+        # 1. Minimize delays (weighted by priority), plus 3. total system disruption
+        delay_weights = config.delay_weight * (6 - priorities) * config.priority_multiplier + config.delay_weight * 0.01
         
         # 2. Minimize journey times
-        for train in trains:
-            journey_weight = self.config.delay_weight * 0.1  # Small weight for journey time
-            objective_terms.append(journey_weight * j[train.train_id])
-        
-        # 3. Penalize conflicts (heavily weighted)
-        for conflict in conflicts:
-            conflict_penalty = self.config.conflict_weight * (6 - conflict.severity)
-            objective_terms.append(conflict_penalty * c[conflict.conflict_id])
+        journey_weights = np.full(len(trains), config.delay_weight * 0.1)  # Small weight for journey time
         
-        # 4. Minimize total system disruption
-        total_delay = sum(s[train.train_id] for train in trains)
-        objective_terms.append(self.config.delay_weight * 0.01 * total_delay)
-        
-        model.Minimize(sum(objective_terms))
+        variables = [s[train.train_id] for train in trains] + [j[train.train_id] for train in trains]
+        if variables:
+            weights = np.concatenate([delay_weights, journey_weights])
+            model.Minimize(cp_model.LinearExpr.WeightedSum(variables, weights.tolist()))
     
     def _solve_model(self, model: cp_model.CpModel, warm_start: Optional[List[ScheduleEntry]] = None) -> Optional[cp_model.CpSolver]:
         """Solve the optimization model"""
-        solver = cp_model.CpSolver()
+        solver = self.solver
         
         # Solver parameters
         solver.parameters.max_time_in_seconds = self.config.max_solve_time_seconds
-        solver.parameters.num_search_workers = 4  # Parallel search
-        solver.parameters.log_search_progress = True
-        
-        # Apply warm start if provided
-        if warm_start:
-            self._apply_warm_start(solver, warm_start)
-        
-        # Solve
-        status = solver.Solve(model)
+        solver.parameters.num_search_workers = self.config.num_search_workers  # Parallel search
+        # The one stopping rule for a good-enough incumbent; _SearchProgress only logs
+        solver.parameters.relative_gap_limit = self.config.relative_gap_limit
+        solver.parameters.cp_model_presolve = True
+        # Opt-in only: the search log costs time on short solves. Always
+        # assigned because the solver object is shared between requests
+        solver.parameters.log_search_progress = self.config.log_search_progress
+        if self.config.log_search_progress:
+            # Route the search log through logging instead of stdout
+            solver.parameters.log_to_stdout = False
+            solver.log_callback = logger.info
+        
+        # Apply warm start if provided; it takes precedence over the last solution
+        model.ClearHints()
+        hinted = self._apply_warm_start(model, warm_start) if warm_start else set()
+        
+        # Hint the previous solution on the same network; names are stable
+        # across requests, so matching variables start from their last value
+        topology = self.topology
+        if topology is not None and topology.last_solution:
+            last_solution = topology.last_solution
+            for name, var in self._iter_variables():
+                value = last_solution.get(name)
+                if value is not None and var.Index() not in hinted:
+                    model.AddHint(var, value)
+        
+        # Solve; relative_gap_limit returns the incumbent early once the gap is
+        # closed and the time limit bounds the rest
+        progress = _SearchProgress()
+        status = solver.Solve(model, progress)
+        
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            # Copy the response out once; extraction, metrics and the hint
+            # snapshot index into it instead of calling solver.Value() per variable
+            solution = np.asarray(solver.ResponseProto().solution, dtype=np.int64)
+            self.solution_values = solution
+            if topology is not None:
+                named = list(self._iter_variables())
+                values = solution[[var.Index() for _, var in named]].tolist()
+                topology.last_solution = {name: value for (name, _), value in zip(named, values)}
         
         if status == cp_model.OPTIMAL:
             logger.info(f"Optimal solution found. Objective: {solver.ObjectiveValue()}")
             return solver
         elif status == cp_model.FEASIBLE:
-            logger.info(f"Feasible solution found. Objective: {solver.ObjectiveValue()}")
+            logger.info(f"Feasible solution found after {progress.solutions} improvements. "
+                        f"Objective: {solver.ObjectiveValue()}, bound: {solver.BestObjectiveBound()}")
             return solver
+        elif status == cp_model.INFEASIBLE and self.assumptions:
+            # The core names the constraint groups that cannot hold together
+            core = self._infeasibility_core(model)
+            logger.error(f"Model infeasible; conflicting constraints: {core}")
+            raise InfeasibleScheduleError(core)
         else:
             logger.error(f"Solver failed with status: {solver.StatusName(status)}")
             return None
     
-    def _extract_schedule(self, solver: cp_model.CpSolver, trains: List[TrainData], 
-                         tracks: List[TrackData]) -> List[ScheduleEntry]:
-        """Extract the optimized schedule from solver solution"""
-        schedule = []
-        x = self.variables['x']
-        p = self.variables['p']
-        base_time = datetime.now().replace(second=0, microsecond=0)
-        
-        for train in trains:
-            for track in tracks:
-                if track.segment_id in x[train.train_id]:
-                    start_time = None
-                    end_time = None
-                    
-                    # Find continuous occupation period
-                    for t in range(self.config.time_horizon_minutes):
-                        if solver.Value(x[train.train_id][track.segment_id][t]) == 1:
-                            if start_time is None:
-                                start_time = base_time + timedelta(minutes=t)
-                            end_time = base_time + timedelta(minutes=t + 1)
-                        elif start_time is not None:
-                            # End of occupation period
-                            break
-                    
-                    if start_time and end_time:
-                        # Get platform assignment if available
-                        platform = None
-                        for station_code in train.route:
-                            if (train.train_id in p and station_code in p[train.train_id]):
-                                platform = solver.Value(p[train.train_id][station_code])
-                                break
-                        
-                        schedule.append(ScheduleEntry(
-                            train_id=train.train_id,
-                            segment_id=track.segment_id,
-                            start_time=start_time,
-                            end_time=end_time,
-                            platform=platform
-                        ))
-        
-        return sorted(schedule, key=lambda x: x.start_time)
+    def _iter_variables(self):
+        """(name, var) for every decision variable of the current model"""
+        stack = list(self.variables.values())
+        while stack:
+            group = stack.pop()
+            for var in group.values():
+                if isinstance(var, dict):
+                    stack.append(var)
+                else:
+                    yield var.Name(), var
     
-    def _calculate_metrics(self, solver: cp_model.CpSolver, trains: List[TrainData], 
-                          conflicts: List[ConflictData]) -> Dict[str, float]:
-        """Calculate optimization metrics"""
-        s = self.variables['s']
-        c = self.variables['c']
-        j = self.variables['j']
-        
-        total_delay = sum(solver.Value(s[train.train_id]) for train in trains)
-        conflicts_resolved = sum(1 for conflict in conflicts if solver.Value(c[conflict.conflict_id]) == 0)
-        objective_value = solver.ObjectiveValue()
-        
-        return {
-            'objective_value': objective_value,
+    def _extract_all(self, solver: cp_model.CpSolver, trains: List[TrainData], 
+                     tracks: List[TrackData], conflicts: List[ConflictData]) -> Tuple[List[ScheduleEntry], Dict[str, float]]:
+        """Extract the optimized schedule and its metrics in one gather over the solver solution"""
+        table = self.segment_table
+        n_rows = len(table.keys)
+        n_trains = len(table.delay_index)
+        
+        # One fancy index into the response solution for every value read
+        values = self.solution_values[np.concatenate([
+            table.columns.ravel(), table.delay_index, table.journey_index
+        ])]
+        columns = values[:3 * n_rows].reshape(-1, 3)
+        delays = values[3 * n_rows:3 * n_rows + n_trains]
+        journeys = values[3 * n_rows + n_trains:]
+        
+        minutes = columns[:, :2]
+        order = np.argsort(minutes[:, 0], kind='stable')
+        platforms = np.where(table.columns[:, 2] >= 0, columns[:, 2], -1)[order].tolist()
+        times = (self.base_time + minutes[order].astype('timedelta64[m]')).tolist()
+        rows = [table.keys[k] for k in order.tolist()]
+        schedule = ScheduleEntry.from_arrays(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [start for start, _ in times],
+            [end for _, end in times],
+            [platform if platform >= 0 else None for platform in platforms]
+        )
+        
+        total_delay = int(delays.sum())
+        metrics = {
+            'objective_value': solver.ObjectiveValue(),
             'total_delay': total_delay,
-            'conflicts_resolved': conflicts_resolved,
+            'conflicts_resolved': self._count_resolved_conflicts(tracks, conflicts),
             'average_delay': total_delay / len(trains) if trains else 0,
-            'average_journey_time': sum(solver.Value(j[train.train_id]) for train in trains) / len(trains) if trains else 0
+            'average_journey_time': float(journeys.mean()) if trains else 0
         }
+        return schedule, metrics
     
-    def _get_route_segments(self, train: TrainData, tracks: List[TrackData]) -> List[str]:
-        """Get route segments for a train based on its route and available tracks"""
-        segments = []
-        route_stations = train.route
+    def _count_resolved_conflicts(self, tracks: List[TrackData], conflicts: List[ConflictData]) -> int:
+        """
+        Track-occupation conflicts on a known track with more of their trains
+        routed over it than its capacity: the capacity constraint resolves
+        each of them. Other conflicts are not modelled and are not counted
+        """
+        track_by_id = self._get_topology(tracks).track_by_id
+        start = self.variables['start']
+        resolved = 0
+        for conflict in conflicts:
+            track = track_by_id.get(conflict.resource_id)
+            if conflict.conflict_type != ConflictType.TRACK_OCCUPATION.value or track is None:
+                continue
+            routed = sum(1 for train_id in set(conflict.train_ids) if conflict.resource_id in start.get(train_id, {}))
+            if routed > track.capacity:
+                resolved += 1
+        return resolved
+    
+    def _build_segment_table(self, trains: List[TrainData]) -> SegmentTable:
+        """Flatten the variables read back after solving into index arrays"""
+        start = self.variables['start']
+        end = self.variables['end']
+        p = self.variables['p']
+        s = self.variables['s']
+        j = self.variables['j']
         
-        for i in range(len(route_stations) - 1):
-            from_station = route_stations[i]
-            to_station = route_stations[i + 1]
+        keys = []
+        columns = []
+        for train in trains:
+            # Platform at the first station, if the route has one; p is keyed in route order
+            first_platform = next(iter(p.get(train.train_id, {}).values()), None)
+            platform_index = first_platform.Index() if first_platform is not None else -1
             
-            # Find track segment connecting these stations
-            for track in tracks:
-                if ((track.from_station == from_station and track.to_station == to_station) or
-                    (track.from_station == to_station and track.to_station == from_station)):
-                    segments.append(track.segment_id)
-                    break
-        
-        return segments
+            for segment_id, seg_start in start[train.train_id].items():
+                keys.append((train.train_id, segment_id))
+                columns.append((seg_start.Index(), end[train.train_id][segment_id].Index(), platform_index))
+        
+        return SegmentTable(
+            keys=keys,
+            columns=np.asarray(columns, dtype=np.int64).reshape(-1, 3),
+            delay_index=np.array([s[train.train_id].Index() for train in trains], dtype=np.int64),
+            journey_index=np.array([j[train.train_id].Index() for train in trains], dtype=np.int64)
+        )
     
-    def _get_route_segments_from_train(self, train: TrainData) -> List[str]:
-        """Extract route segments from train data"""
-        # This is a simplified version - in practice, you'd have more complex route mapping
-        return [f"{train.route[i]}-{train.route[i+1]}" for i in range(len(train.route) - 1)]
+    def _get_route_segments(self, train: TrainData, tracks: List[TrackData]) -> List[str]:
+        """Get route segments for a train based on its route and available tracks"""
+        topology = self._get_topology(tracks)
+        route_stations = tuple(train.route)
+        segments = topology.route_segments.get(route_stations)
+        if segments is None:
+            # Find the track segment connecting each consecutive station pair
+            segment_by_stations = topology.segment_by_stations
+            segments = [
+                segment_by_stations[pair]
+                for pair in zip(route_stations, route_stations[1:])
+                if pair in segment_by_stations
+            ]
+            topology.route_segments[route_stations] = segments
+        return segments
     
     def _get_scheduled_start_minutes(self, train: TrainData) -> Optional[int]:
         """Get scheduled start time in minutes from base time"""
-        if train.scheduled_arrival:
-            base_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            return int((train.scheduled_arrival - base_time).total_seconds() / 60)
-        return None
+        # Converted for all trains at once by _begin_request; same origin as
+        # _extract_all, so minute 0 is "now"
+        return self.scheduled_starts.get(train.train_id)
     
-    def _apply_warm_start(self, solver: cp_model.CpSolver, warm_start: List[ScheduleEntry]):
-        """Apply warm start solution to solver"""
-        # This is a placeholder for warm start implementation
-        # In practice, you'd map the warm start solution to decision variables
+    def _apply_warm_start(self, model: cp_model.CpModel, warm_start: List[ScheduleEntry]) -> Set[int]:
+        """Hint a previous schedule to the model; returns the indices of the hinted variables"""
         logger.info(f"Applying warm start with {len(warm_start)} schedule entries")
-        pass
+        start = self.variables['start']
+        size = self.variables['size']
+        end = self.variables['end']
+        s = self.variables['s']
+        p = self.variables['p']
+        j = self.variables['j']
+        entry_minutes = _minutes_from(
+            self.base_time, [time for entry in warm_start for time in (entry.start_time, entry.end_time)]
+        ).astype(np.int64).reshape(-1, 2).tolist()
+        
+        hints = {}
+        for entry, (entry_start, entry_end) in zip(warm_start, entry_minutes):
+            train_segments = start.get(entry.train_id)
+            if not train_segments or entry.segment_id not in train_segments:
+                continue
+            
+            hints[start[entry.train_id][entry.segment_id]] = entry_start
+            hints[end[entry.train_id][entry.segment_id]] = entry_end
+            hints[size[entry.train_id][entry.segment_id]] = entry_end - entry_start
+            
+            route_segments = list(train_segments)
+            if entry.segment_id == route_segments[0]:
+                # The start constraint's right-hand side is the earliest start
+                constraint = self.start_constraints.get(entry.train_id)
+                if constraint is not None:
+                    earliest_start = constraint.Proto().linear.domain[0]
+                    hints[s[entry.train_id]] = max(entry_start - earliest_start, 0)
+                platforms = p.get(entry.train_id)
+                if entry.platform is not None and platforms:
+                    hints[next(iter(platforms.values()))] = entry.platform
+            if entry.segment_id == route_segments[-1]:
+                hints[j[entry.train_id]] = entry_end
+        
+        for var, value in hints.items():
+            model.AddHint(var, value)
+        return {var.Index() for var in hints}
 
 class GurobiOptimizer(RailwayOptimizer):
     """Alternative optimizer using Gurobi (if available)"""
@@ -480,13 +832,14 @@ class GurobiOptimizer(RailwayOptimizer):
     
     def optimize(self, trains: List[TrainData], tracks: List[TrackData], 
                 conflicts: List[ConflictData], time_horizon: int = 240,
-                warm_start: Optional[List[ScheduleEntry]] = None) -> OptimizationResult:
+                warm_start: Optional[List[ScheduleEntry]] = None,
+                conditions: Optional[NetworkConditions] = None) -> OptimizationResult:
         """Optimize using Gurobi MILP solver"""
         if not self.gurobi_available:
             # Fall back to OR-Tools
-            return super().optimize(trains, tracks, conflicts, time_horizon, warm_start)
+            return super().optimize(trains, tracks, conflicts, time_horizon, warm_start, conditions)
         
         # Gurobi implementation would go here
         # For now, fall back to OR-Tools
         logger.info("Using Gurobi optimizer (placeholder - falling back to OR-Tools)")
-        return super().optimize(trains, tracks, conflicts, time_horizon, warm_start)
+        return super().optimize(trains, tracks, conflicts, time_horizon, warm_start, conditions)
@@ -1,13 +1,65 @@
 import time
 import logging
-from typing import Dict, List, Any
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Any, Optional
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta
+from operator import attrgetter
 import json
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# One handle for this process; psutil.Process() does syscalls on creation
+_PROCESS = psutil.Process() if PSUTIL_AVAILABLE else None
+BYTES_PER_MB = 1.0 / (1024 * 1024)
+# Fast levels already shrink repetitive metrics JSON several times over
+ZSTD_LEVEL = 3
+
+def _dump_json(data: Any) -> bytes:
+    """Indented JSON bytes; datetimes are written as ISO 8601 strings"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, indent=2, default=datetime.isoformat).encode()
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Runs kept in the history, and averaged by get_performance_summary
+HISTORY_SIZE = 100
+SUMMARY_WINDOW = 10
+_WINDOW_MASK = (1 << SUMMARY_WINDOW) - 1
+# Solver statuses that count towards the success rate
+_OK_STATUSES = frozenset(("OPTIMAL", "FEASIBLE"))
+
+# get_detailed_metrics keys and the OptimizationMetrics fields they read, in order
+_DETAIL_KEYS = (
+    "timestamp", "solve_time_seconds", "objective_value", "num_trains", "num_tracks",
+    "num_conflicts", "conflicts_resolved", "total_delay_minutes", "solver_status",
+    "memory_usage_mb", "variables_count", "constraints_count"
+)
+_detail_values = attrgetter(
+    "start_time_iso", "solve_time_seconds", "objective_value", "num_trains", "num_tracks",
+    "num_conflicts", "conflicts_resolved", "total_delay_minutes", "solver_status",
+    "memory_usage_mb", "variables_count", "constraints_count"
+)
+
+@dataclass(slots=True)
 class OptimizationMetrics:
     """Metrics for optimization performance monitoring"""
     start_time: datetime
@@ -24,138 +76,201 @@ class OptimizationMetrics:
     cpu_usage_percent: float = 0.0
     variables_count: int = 0
     constraints_count: int = 0
+    # start_time.isoformat(), formatted once when the run starts
+    start_time_iso: str = ""
+    # time.perf_counter() at the start; the monotonic base of solve_time_seconds
+    started: float = 0.0
     
 class PerformanceMonitor:
     """Monitor and track optimization performance"""
     
     def __init__(self):
-        self.metrics_history: List[OptimizationMetrics] = []
+        # Oldest runs drop off in O(1) once HISTORY_SIZE is reached
+        self.metrics_history: Deque[OptimizationMetrics] = deque(maxlen=HISTORY_SIZE)
+        # Most recently started run, for callers that do not pass their run back
         self.current_metrics: OptimizationMetrics = None
+        # (solve_time, objective, conflicts_resolved) of the last SUMMARY_WINDOW
+        # runs, with running sums kept in step
+        self._recent_window = deque(maxlen=SUMMARY_WINDOW)
+        self._sum_solve = 0.0
+        self._sum_objective = 0.0
+        self._sum_conflicts = 0
+        # One bit per run in the window, newest lowest; set when the run succeeded
+        self._success_bits = 0
+        # Summary of the runs so far; dropped whenever a run is added
+        self._summary_cache: Optional[Dict[str, Any]] = None
+        # "last_run" entry of the summary, built when the run is recorded
+        self._last_run_view: Dict[str, Any] = {}
+        # Guards the history, the window and current_metrics; held only for
+        # the bookkeeping, never while taking system readings
+        self._lock = threading.Lock()
+        if PSUTIL_AVAILABLE:
+            # Non-blocking readings measure since the previous call; prime the
+            # counter so the first run gets a real interval
+            psutil.cpu_percent(interval=None)
         
-    def start_optimization(self, num_trains: int, num_tracks: int, num_conflicts: int):
-        """Start monitoring an optimization run"""
-        self.current_metrics = OptimizationMetrics(
-            start_time=datetime.now(),
+    def start_optimization(self, num_trains: int, num_tracks: int, num_conflicts: int) -> OptimizationMetrics:
+        """
+        Start monitoring an optimization run. Returns the run's metrics;
+        concurrent runs pass them to end_optimization and set_model_complexity
+        so they do not record into each other
+        """
+        # Monotonic clock for the elapsed time; the datetime is for display only
+        started = time.perf_counter()
+        start_time = datetime.now()
+        run = OptimizationMetrics(
+            start_time=start_time,
+            start_time_iso=start_time.isoformat(),
             num_trains=num_trains,
             num_tracks=num_tracks,
-            num_conflicts=num_conflicts
+            num_conflicts=num_conflicts,
+            started=started
         )
+        with self._lock:
+            self.current_metrics = run
         
         logger.info(f"Started optimization monitoring: {num_trains} trains, {num_tracks} tracks, {num_conflicts} conflicts")
+        return run
     
     def end_optimization(self, objective_value: float, conflicts_resolved: int, 
-                        total_delay: int, solver_status: str):
-        """End monitoring and record final metrics"""
-        if not self.current_metrics:
+                        total_delay: int, solver_status: str, run: Optional[OptimizationMetrics] = None):
+        """End monitoring and record final metrics for run, by default the most recently started one"""
+        if run is None:
+            with self._lock:
+                run = self.current_metrics
+        if not run:
             return
         
-        self.current_metrics.end_time = datetime.now()
-        self.current_metrics.solve_time_seconds = (
-            self.current_metrics.end_time - self.current_metrics.start_time
-        ).total_seconds()
-        self.current_metrics.objective_value = objective_value
-        self.current_metrics.conflicts_resolved = conflicts_resolved
-        self.current_metrics.total_delay_minutes = total_delay
-        self.current_metrics.solver_status = solver_status
+        # The run belongs to this caller alone until it is added to the history
+        metrics = run
+        elapsed = time.perf_counter() - metrics.started
+        metrics.solve_time_seconds = elapsed
+        metrics.end_time = metrics.start_time + timedelta(seconds=elapsed)
+        metrics.objective_value = objective_value
+        metrics.conflicts_resolved = conflicts_resolved
+        metrics.total_delay_minutes = total_delay
+        metrics.solver_status = solver_status
         
         # Record system metrics
-        self.current_metrics.memory_usage_mb = self._get_memory_usage()
-        self.current_metrics.cpu_usage_percent = self._get_cpu_usage()
+        metrics.memory_usage_mb = self._get_memory_usage()
+        metrics.cpu_usage_percent = self._get_cpu_usage()
         
-        # Add to history
-        self.metrics_history.append(self.current_metrics)
+        last_run_view = {
+            "solve_time": metrics.solve_time_seconds,
+            "objective": metrics.objective_value,
+            "status": metrics.solver_status,
+            "trains": metrics.num_trains,
+            "conflicts_resolved": metrics.conflicts_resolved
+        }
         
-        # Keep only last 100 runs
-        if len(self.metrics_history) > 100:
-            self.metrics_history = self.metrics_history[-100:]
+        # Add to history
+        with self._lock:
+            self.metrics_history.append(metrics)
+            self._add_to_window(metrics)
+            self._last_run_view = last_run_view
+            self._summary_cache = None
         
-        logger.info(f"Optimization completed in {self.current_metrics.solve_time_seconds:.2f}s")
+        logger.info(f"Optimization completed in {metrics.solve_time_seconds:.2f}s")
         
     def get_performance_summary(self) -> Dict[str, Any]:
-        """Get performance summary statistics"""
-        if not self.metrics_history:
-            return {"message": "No optimization runs recorded"}
-        
-        recent_runs = self.metrics_history[-10:]  # Last 10 runs
-        
-        avg_solve_time = sum(m.solve_time_seconds for m in recent_runs) / len(recent_runs)
-        avg_objective = sum(m.objective_value for m in recent_runs) / len(recent_runs)
-        avg_conflicts_resolved = sum(m.conflicts_resolved for m in recent_runs) / len(recent_runs)
-        
-        success_rate = sum(1 for m in recent_runs if m.solver_status in ["OPTIMAL", "FEASIBLE"]) / len(recent_runs)
-        
-        return {
-            "total_runs": len(self.metrics_history),
-            "recent_runs": len(recent_runs),
-            "average_solve_time_seconds": round(avg_solve_time, 2),
-            "average_objective_value": round(avg_objective, 2),
-            "average_conflicts_resolved": round(avg_conflicts_resolved, 1),
-            "success_rate_percent": round(success_rate * 100, 1),
-            "last_run": {
-                "solve_time": self.metrics_history[-1].solve_time_seconds,
-                "objective": self.metrics_history[-1].objective_value,
-                "status": self.metrics_history[-1].solver_status,
-                "trains": self.metrics_history[-1].num_trains,
-                "conflicts_resolved": self.metrics_history[-1].conflicts_resolved
+        """Get performance summary statistics; the dict is shared until the next run, so don't modify it"""
+        with self._lock:
+            if not self.metrics_history:
+                return {"message": "No optimization runs recorded"}
+            if self._summary_cache is not None:
+                return self._summary_cache
+            
+            recent_runs = len(self._recent_window)  # Last SUMMARY_WINDOW runs
+            avg_solve_time = self._sum_solve / recent_runs
+            avg_objective = self._sum_objective / recent_runs
+            avg_conflicts_resolved = self._sum_conflicts / recent_runs
+            
+            success_rate = self._success_bits.bit_count() / recent_runs
+            
+            self._summary_cache = {
+                "total_runs": len(self.metrics_history),
+                "recent_runs": recent_runs,
+                "average_solve_time_seconds": round(avg_solve_time, 2),
+                "average_objective_value": round(avg_objective, 2),
+                "average_conflicts_resolved": round(avg_conflicts_resolved, 1),
+                "success_rate_percent": round(success_rate * 100, 1),
+                "last_run": self._last_run_view
             }
-        }
+            return self._summary_cache
+    
+    def _add_to_window(self, metrics: OptimizationMetrics):
+        """Push a finished run into the summary window, updating the running sums; caller holds _lock"""
+        window = self._recent_window
+        if len(window) == window.maxlen:
+            solve_time, objective, conflicts_resolved = window[0]
+            self._sum_solve -= solve_time
+            self._sum_objective -= objective
+            self._sum_conflicts -= conflicts_resolved
+        
+        entry = (metrics.solve_time_seconds, metrics.objective_value, metrics.conflicts_resolved)
+        window.append(entry)
+        self._sum_solve += entry[0]
+        self._sum_objective += entry[1]
+        self._sum_conflicts += entry[2]
+        # Shifting pushes the oldest run's bit past the window mask
+        succeeded = metrics.solver_status in _OK_STATUSES
+        self._success_bits = ((self._success_bits << 1) | succeeded) & _WINDOW_MASK
     
     def get_detailed_metrics(self) -> List[Dict[str, Any]]:
         """Get detailed metrics for all runs"""
-        return [
-            {
-                "timestamp": m.start_time.isoformat(),
-                "solve_time_seconds": m.solve_time_seconds,
-                "objective_value": m.objective_value,
-                "num_trains": m.num_trains,
-                "num_tracks": m.num_tracks,
-                "num_conflicts": m.num_conflicts,
-                "conflicts_resolved": m.conflicts_resolved,
-                "total_delay_minutes": m.total_delay_minutes,
-                "solver_status": m.solver_status,
-                "memory_usage_mb": m.memory_usage_mb,
-                "variables_count": m.variables_count,
-                "constraints_count": m.constraints_count
-            }
-            for m in self.metrics_history
-        ]
+        with self._lock:
+            history = list(self.metrics_history)
+        return [dict(zip(_DETAIL_KEYS, _detail_values(m))) for m in history]
     
-    def export_metrics(self, filename: str):
-        """Export metrics to JSON file"""
+    def export_metrics(self, filename: str, compress: bool = False) -> str:
+        """Export metrics to JSON file, zstd-compressed to filename.zst if compress is set; returns the path written"""
+        if compress and not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required for compressed metrics export")
+        
+        # Counted from the snapshot taken under the lock, not the live history
+        detailed_metrics = self.get_detailed_metrics()
         metrics_data = {
-            "export_timestamp": datetime.now().isoformat(),
-            "total_runs": len(self.metrics_history),
+            "export_timestamp": datetime.now(),
+            "total_runs": len(detailed_metrics),
             "summary": self.get_performance_summary(),
-            "detailed_metrics": self.get_detailed_metrics()
+            "detailed_metrics": detailed_metrics
         }
         
-        with open(filename, 'w') as f:
-            json.dump(metrics_data, f, indent=2)
+        payload = _dump_json(metrics_data)
+        if compress:
+            filename += ".zst"
+            with open(filename, 'wb') as f:
+                with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f) as writer:
+                    writer.write(payload)
+        else:
+            with open(filename, 'wb') as f:
+                f.write(payload)
         
         logger.info(f"Metrics exported to {filename}")
+        return filename
     
     def _get_memory_usage(self) -> float:
         """Get current memory usage in MB"""
-        try:
-            import psutil
-            process = psutil.Process()
-            return process.memory_info().rss / 1024 / 1024  # Convert to MB
-        except ImportError:
+        if _PROCESS is None:
             return 0.0
+        return _PROCESS.memory_info().rss * BYTES_PER_MB
     
     def _get_cpu_usage(self) -> float:
-        """Get current CPU usage percentage"""
-        try:
-            import psutil
-            return psutil.cpu_percent(interval=0.1)
-        except ImportError:
+        """Get CPU usage percentage since the previous reading"""
+        if not PSUTIL_AVAILABLE:
             return 0.0
+        # interval=None returns immediately instead of sleeping to sample
+        return psutil.cpu_percent(interval=None)
     
-    def set_model_complexity(self, variables_count: int, constraints_count: int):
-        """Set model complexity metrics"""
-        if self.current_metrics:
-            self.current_metrics.variables_count = variables_count
-            self.current_metrics.constraints_count = constraints_count
+    def set_model_complexity(self, variables_count: int, constraints_count: int,
+                             run: Optional[OptimizationMetrics] = None):
+        """Set model complexity metrics of run, by default the most recently started one"""
+        if run is None:
+            with self._lock:
+                run = self.current_metrics
+        if run:
+            run.variables_count = variables_count
+            run.constraints_count = constraints_count
 
 # Global performance monitor instance
 performance_monitor = PerformanceMonitor()
@@ -1,16 +1,42 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, field_validator
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
+from enum import IntEnum
+import sys
+
+def _intern_ids(value: Union[str, List[str]]) -> Union[str, List[str]]:
+    """Share one str object per identifier, so id lookups across models hit on identity"""
+    if isinstance(value, list):
+        return [sys.intern(item) for item in value]
+    return sys.intern(value)
+
+class Priority(IntEnum):
+    """Train priority; 1=highest, 5=lowest"""
+    HIGHEST = 1
+    HIGH = 2
+    NORMAL = 3
+    LOW = 4
+    LOWEST = 5
+
+class Severity(IntEnum):
+    """Conflict severity; 1=critical, 5=minor"""
+    CRITICAL = 1
+    MAJOR = 2
+    MODERATE = 3
+    LOW = 4
+    MINOR = 5
 
 class TrainData(BaseModel):
     train_id: str
     current_position: str  # station or track segment
     scheduled_arrival: datetime
-    actual_arrival: Optional[datetime]
-    priority: int  # 1=highest, 5=lowest
+    actual_arrival: Optional[datetime] = None
+    priority: Priority  # 1=highest, 5=lowest
     delay_minutes: int = 0
     destination: str
     route: List[str]  # list of station/track codes
+    
+    _intern = field_validator('train_id', 'current_position', 'destination', 'route')(_intern_ids)
 
 class TrackData(BaseModel):
     segment_id: str
@@ -18,13 +44,19 @@ class TrackData(BaseModel):
     to_station: str
     capacity: int = 1  # number of trains that can occupy simultaneously
     headway_minutes: int = 5  # minimum time between trains
+    distance_km: Optional[float] = None  # unknown: no restriction or weather delay is derived
+    max_speed_kmh: int = 100
+    
+    _intern = field_validator('segment_id', 'from_station', 'to_station')(_intern_ids)
 
 class ConflictData(BaseModel):
     conflict_id: str
     train_ids: List[str]
     resource_id: str  # track or platform
     conflict_type: str  # "track_occupation", "platform_conflict", "junction_crossing"
-    severity: int  # 1=critical, 5=minor
+    severity: Severity  # 1=critical, 5=minor
+    
+    _intern = field_validator('conflict_id', 'train_ids', 'resource_id')(_intern_ids)
 
 class ScheduleEntry(BaseModel):
     train_id: str
@@ -32,6 +64,31 @@ class ScheduleEntry(BaseModel):
     start_time: datetime
     end_time: datetime
     platform: Optional[int]
+    
+    @classmethod
+    def from_arrays(cls, train_ids: List[str], segment_ids: List[str], start_times: List[datetime],
+                    end_times: List[datetime], platforms: List[Optional[int]]) -> List["ScheduleEntry"]:
+        """Build entries from parallel columns of solver output, skipping validation of trusted values"""
+        return [
+            cls.model_construct(train_id=train_id, segment_id=segment_id, start_time=start_time,
+                                end_time=end_time, platform=platform)
+            for train_id, segment_id, start_time, end_time, platform
+            in zip(train_ids, segment_ids, start_times, end_times, platforms)
+        ]
+
+class MaintenanceWindow(BaseModel):
+    track_id: str
+    start_minute: int  # minutes from the request, inclusive
+    end_minute: int  # inclusive
+    
+    _intern = field_validator('track_id')(_intern_ids)
+
+class NetworkConditions(BaseModel):
+    """Temporary operating conditions on the network"""
+    junctions: Dict[str, List[str]] = {}  # junction id -> segment ids crossing it
+    maintenance_windows: List[MaintenanceWindow] = []
+    speed_restrictions: Dict[str, int] = {}  # segment id -> restricted speed in km/h
+    weather_conditions: Dict[str, str] = {}  # segment id -> "heavy_rain", "fog", "snow", "high_wind", "normal"
 
 class ScheduleRequest(BaseModel):
     trains: List[TrainData]
@@ -39,6 +96,7 @@ class ScheduleRequest(BaseModel):
     conflicts: List[ConflictData]
     time_horizon_minutes: int = 240  # 4 hours
     warm_start_solution: Optional[List[ScheduleEntry]] = None
+    conditions: Optional[NetworkConditions] = None
 
 class OptimizationResult(BaseModel):
     schedule: List[ScheduleEntry]
@@ -0,0 +1,149 @@
+import pytest
+from datetime import datetime
+from ortools.sat.python import cp_model
+from src.advanced_constraints import AdvancedConstraintBuilder, restriction_delay_minutes, weather_delay_minutes
+from src.schemas import TrainData, TrackData
+
+HORIZON = 30
+
+@pytest.fixture
+def restricted_track():
+    # 6 minutes at line speed, 20 minutes at 30 km/h
+    return TrackData(segment_id="A-B", from_station="A", to_station="B", distance_km=10.0, max_speed_kmh=100)
+
+@pytest.fixture
+def train():
+    return TrainData(
+        train_id="T1",
+        current_position="A",
+        scheduled_arrival=datetime(2024, 1, 1, 12, 0, 0),
+        priority=1,
+        destination="B",
+        route=["A", "B"]
+    )
+
+def _occupancy_grid(model, trains, track_id):
+    return {
+        train.train_id: {track_id: [model.NewBoolVar(f"x_{train.train_id}_{t}") for t in range(HORIZON)]}
+        for train in trains
+    }
+
+def test_restriction_delay_minutes(restricted_track):
+    assert restriction_delay_minutes(restricted_track, 30) == 14
+    assert restriction_delay_minutes(restricted_track, 120) == 0
+    assert weather_delay_minutes(restricted_track, 50) == 6
+
+def test_restriction_delay_without_distance():
+    track = TrackData(segment_id="A-B", from_station="A", to_station="B")
+    assert restriction_delay_minutes(track, 30) == 0
+
+def test_speed_restricted_segment_occupation(restricted_track, train):
+    model = cp_model.CpModel()
+    x = _occupancy_grid(model, [train], restricted_track.segment_id)
+    slots = x[train.train_id][restricted_track.segment_id]
+    
+    builder = AdvancedConstraintBuilder(model, time_horizon=HORIZON)
+    builder.add_speed_restriction_constraints([train], [restricted_track], x, {restricted_track.segment_id: 30})
+    
+    # Enter the track at minute 5 and occupy it as briefly as allowed
+    model.Add(slots[5] == 1)
+    model.Add(slots[4] == 0)
+    model.Minimize(sum(slots))
+    
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    occupied = [t for t in range(HORIZON) if solver.Value(slots[t])]
+    assert occupied == list(range(5, 20))
+
+@pytest.mark.parametrize("capacity", [1, 2])
+def test_overtaking_station_capacity(train, capacity):
+    track = TrackData(segment_id="A-B", from_station="A", to_station="B", capacity=capacity)
+    trains = [train.model_copy(update={"train_id": f"T{i}"}) for i in range(3)]
+    model = cp_model.CpModel()
+    x = _occupancy_grid(model, trains, track.segment_id)
+    
+    builder = AdvancedConstraintBuilder(model, time_horizon=HORIZON)
+    builder.add_priority_overtaking_constraints(trains, [track], x, {"A"})
+    
+    # Put as many trains as possible on the station track in the first slot
+    first_slot = [x[t.train_id][track.segment_id][0] for t in trains]
+    model.Maximize(sum(first_slot))
+    
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    assert solver.ObjectiveValue() == capacity
+
+def test_overtaking_time_windows_forbid_slots_outside_window(train):
+    track = TrackData(segment_id="A-B", from_station="A", to_station="B")
+    trains = [train.model_copy(update={"train_id": f"T{i}"}) for i in range(3)]
+    model = cp_model.CpModel()
+    x = _occupancy_grid(model, trains, track.segment_id)
+    windows = {"T0": {"A-B": (0, 29)}, "T1": {"A-B": (10, 29)}, "T2": {"A-B": (20, 29)}}
+    
+    builder = AdvancedConstraintBuilder(model, time_horizon=HORIZON)
+    builder.add_priority_overtaking_constraints(trains, [track], x, {"A"}, windows)
+    
+    # Only T0 can be on the station track at minute 5
+    for t in trains:
+        model.Add(x[t.train_id][track.segment_id][5] == 1)
+    
+    assert cp_model.CpSolver().Solve(model) == cp_model.INFEASIBLE
+
+def test_train_time_windows(train):
+    # 6 and 12 minutes at line speed; C-D has no distance and counts as 0
+    tracks = [
+        TrackData(segment_id="A-B", from_station="A", to_station="B", distance_km=10.0, max_speed_kmh=100),
+        TrackData(segment_id="B-C", from_station="B", to_station="C", distance_km=20.0, max_speed_kmh=100),
+        TrackData(segment_id="C-D", from_station="C", to_station="D"),
+    ]
+    late = train.model_copy(update={"train_id": "T2", "scheduled_arrival": datetime(2024, 1, 1, 12, 5, 0),
+                                    "route": ["A", "B", "C", "D"]})
+    reverse = train.model_copy(update={"train_id": "T3", "route": ["C", "B"]})
+    
+    builder = AdvancedConstraintBuilder(cp_model.CpModel(), time_horizon=HORIZON)
+    windows = builder.train_time_windows([late, reverse], tracks, datetime(2024, 1, 1, 12, 0, 0))
+    
+    assert windows == {
+        "T2": {"A-B": (5, 17), "B-C": (11, 29), "C-D": (23, 29)},
+        "T3": {"B-C": (0, 29)},
+    }
+
+def test_junction_grid_allows_one_train(train):
+    trains = [train, train.model_copy(update={"train_id": "T2", "route": ["C", "D"]})]
+    model = cp_model.CpModel()
+    x = {
+        "T1": {"A-B": [model.NewBoolVar(f"x_T1_{t}") for t in range(HORIZON)]},
+        "T2": {"C-D": [model.NewBoolVar(f"x_T2_{t}") for t in range(HORIZON)]}
+    }
+    
+    builder = AdvancedConstraintBuilder(model, time_horizon=HORIZON)
+    builder.add_junction_constraints(trains, [], x, {"J1": ["A-B", "C-D"]})
+    model.Add(x["T1"]["A-B"][3] == 1)
+    model.Add(x["T2"]["C-D"][3] == 1)
+    
+    assert cp_model.CpSolver().Solve(model) == cp_model.INFEASIBLE
+
+def test_maintenance_window_grid(restricted_track, train):
+    model = cp_model.CpModel()
+    x = _occupancy_grid(model, [train], restricted_track.segment_id)
+    slots = x[train.train_id][restricted_track.segment_id]
+    
+    builder = AdvancedConstraintBuilder(model, time_horizon=HORIZON)
+    builder.add_maintenance_window_constraints(
+        [train], [restricted_track], x, [{"track_id": "A-B", "start_minute": 10, "end_minute": 19}]
+    )
+    model.Maximize(sum(slots))
+    
+    solver = cp_model.CpSolver()
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    assert [t for t in range(HORIZON) if solver.Value(slots[t])] == list(range(10)) + list(range(20, HORIZON))
+
+def test_occupation_extensions(restricted_track):
+    builder = AdvancedConstraintBuilder(cp_model.CpModel(), time_horizon=HORIZON)
+    
+    extensions = builder.occupation_extensions(
+        [restricted_track], {"A-B": 30, "X-Y": 30}, {"A-B": "fog"}
+    )
+    
+    # 14 minutes for the restriction plus 6 for fog; unknown tracks are ignored
+    assert extensions == {"A-B": 20}
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+from datetime import datetime, timedelta
+
+from src.main import app
+
+@pytest.fixture
+def schedule_request():
+    departure = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=10)
+    return {
+        "trains": [
+            {
+                "train_id": "T1",
+                "current_position": "A",
+                "scheduled_arrival": departure.isoformat(),
+                "priority": 1,
+                "destination": "C",
+                "route": ["A", "B", "C"]
+            }
+        ],
+        "tracks": [
+            {"segment_id": "A-B", "from_station": "A", "to_station": "B"},
+            {"segment_id": "B-C", "from_station": "B", "to_station": "C"}
+        ],
+        "conflicts": [],
+        "time_horizon_minutes": 60
+    }
+
+def test_schedule_without_worker_pool(schedule_request):
+    # No lifespan: the startup hook never creates the pool
+    client = TestClient(app)
+    
+    response = client.post("/schedule", json=schedule_request)
+    
+    assert response.status_code == 200
+    assert len(response.json()["optimized_schedule"]) == 2
+
+def test_schedule_after_shutdown(schedule_request):
+    with TestClient(app) as client:
+        assert client.post("/schedule", json=schedule_request).status_code == 200
+    
+    # The pool is gone; requests fall back to solving in process
+    response = TestClient(app).post("/schedule", json=schedule_request)
+    assert response.status_code == 200
+
+def test_infeasible_schedule_names_conflicting_train(schedule_request):
+    # T0 cannot start until after the horizon; T1 alone is feasible
+    late = datetime.fromisoformat(schedule_request["trains"][0]["scheduled_arrival"]) + timedelta(hours=8)
+    schedule_request["trains"] = [
+        {**schedule_request["trains"][0], "train_id": "T0", "scheduled_arrival": late.isoformat()},
+        schedule_request["trains"][0]
+    ]
+    
+    response = TestClient(app).post("/schedule", json=schedule_request)
+    
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicting_constraints"] == ["scheduled_start:T0"]
+
+def test_schedule_with_network_conditions(schedule_request):
+    # A-B is closed until 20 minutes after T1's departure
+    schedule_request["conditions"] = {
+        "maintenance_windows": [{"track_id": "A-B", "start_minute": 0, "end_minute": 29}]
+    }
+    
+    response = TestClient(app).post("/schedule", json=schedule_request)
+    
+    assert response.status_code == 200
+    assert response.json()["total_delay_minutes"] >= 20
@@ -1,15 +1,20 @@
+import itertools
 import pytest
 from datetime import datetime, timedelta
 from src.optimizer import RailwayOptimizer, OptimizationConfig
-from src.schemas import TrainData, TrackData, ConflictData
+from src.schemas import TrainData, TrackData, ConflictData, NetworkConditions, MaintenanceWindow
 
-@pytest.fixture
+# One anchor for the session's sample data. The optimizer measures from the
+# current minute and clamps earlier starts to 0, so this must be now
+ANCHOR_TIME = datetime.now().replace(second=0, microsecond=0)
+
+@pytest.fixture(scope="session")
 def sample_trains():
     return [
         TrainData(
             train_id="12004",
             current_position="NDLS",
-            scheduled_arrival=datetime.now() + timedelta(hours=1),
+            scheduled_arrival=ANCHOR_TIME + timedelta(hours=1),
             priority=1,
             delay_minutes=0,
             destination="LKO",
@@ -18,7 +23,7 @@ def sample_trains():
         TrainData(
             train_id="14006",
             current_position="GZB",
-            scheduled_arrival=datetime.now() + timedelta(hours=1, minutes=30),
+            scheduled_arrival=ANCHOR_TIME + timedelta(hours=1, minutes=30),
             priority=2,
             delay_minutes=15,
             destination="LKO",
@@ -26,7 +31,7 @@ def sample_trains():
         )
     ]
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_tracks():
     return [
         TrackData(
@@ -52,7 +57,7 @@ def sample_tracks():
         )
     ]
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_conflicts():
     return [
         ConflictData(
@@ -85,6 +90,19 @@ def test_optimization_with_sample_data(sample_trains, sample_tracks, sample_conf
     assert result.solve_time > 0
     assert len(result.schedule) > 0
     assert result.objective_value >= 0
+    # Scheduled an hour or more ahead, not clamped to the request's start
+    assert all(minutes > 0 for minutes in optimizer.scheduled_starts.values())
+    # Both trains are routed over the single-track conflict segment
+    assert result.conflicts_resolved == 1
+
+def test_conflict_within_capacity_is_not_resolved(sample_trains, sample_tracks):
+    conflict = ConflictData(conflict_id="conflict_002", train_ids=["12004", "99999"], resource_id="GZB-MB-001",
+                            conflict_type="track_occupation", severity=3)
+    optimizer = RailwayOptimizer()
+    
+    result = optimizer.optimize(trains=sample_trains, tracks=sample_tracks, conflicts=[conflict], time_horizon=120)
+    
+    assert result.conflicts_resolved == 0
 
 def test_route_segments_extraction(sample_trains, sample_tracks):
     optimizer = RailwayOptimizer()
@@ -110,13 +128,246 @@ def test_optimization_config():
 def test_empty_input_handling():
     optimizer = RailwayOptimizer()
     
-    # Test with empty inputs
-    with pytest.raises(Exception):
+    # Rejected before any model is built
+    with pytest.raises(ValueError, match="At least one train"):
         optimizer.optimize(trains=[], tracks=[], conflicts=[])
 
 def test_constraint_building():
     optimizer = RailwayOptimizer()
     
     # Test that model creation doesn't crash
-    model = optimizer._create_model([], [], [])
+    model = optimizer._create_model([], [])
     assert model is not None
+
+def _departing_now(train_id, route, priority=1):
+    return TrainData(
+        train_id=train_id,
+        current_position=route[0],
+        scheduled_arrival=datetime.now().replace(second=0, microsecond=0),
+        priority=priority,
+        destination=route[-1],
+        route=route
+    )
+
+def _entry(result, train_id, segment_id):
+    return next(e for e in result.schedule if e.train_id == train_id and e.segment_id == segment_id)
+
+def test_speed_restriction_lengthens_occupation():
+    tracks = [
+        TrackData(segment_id="A-B", from_station="A", to_station="B", distance_km=10.0, max_speed_kmh=100),
+        TrackData(segment_id="B-C", from_station="B", to_station="C")
+    ]
+    trains = [_departing_now("T1", ["A", "B", "C"])]
+    optimizer = RailwayOptimizer()
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=60,
+                                conditions=NetworkConditions(speed_restrictions={"A-B": 30}))
+    
+    # At least the minimum segment time plus 14 minutes at 30 km/h
+    entry = _entry(result, "T1", "A-B")
+    assert entry.end_time - entry.start_time >= timedelta(minutes=15)
+    
+    # Same request without the restriction builds a separate model
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=60)
+    entry = _entry(result, "T1", "A-B")
+    assert entry.end_time - entry.start_time < timedelta(minutes=15)
+
+def test_maintenance_window_delays_train():
+    tracks = [TrackData(segment_id="A-B", from_station="A", to_station="B")]
+    trains = [_departing_now("T1", ["A", "B"])]
+    optimizer = RailwayOptimizer()
+    conditions = NetworkConditions(maintenance_windows=[MaintenanceWindow(track_id="A-B", start_minute=0, end_minute=29)])
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=120, conditions=conditions)
+    
+    assert _entry(result, "T1", "A-B").start_time >= optimizer.base_time.item() + timedelta(minutes=30)
+    assert result.total_delay_minutes >= 30
+
+def test_junction_serializes_crossing_trains():
+    tracks = [
+        TrackData(segment_id="A-B", from_station="A", to_station="B"),
+        TrackData(segment_id="C-D", from_station="C", to_station="D")
+    ]
+    trains = [_departing_now("T1", ["A", "B"], priority=1), _departing_now("T2", ["C", "D"], priority=3)]
+    optimizer = RailwayOptimizer()
+    conditions = NetworkConditions(junctions={"J1": ["A-B", "C-D"]})
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=60, conditions=conditions)
+    
+    first, second = _entry(result, "T1", "A-B"), _entry(result, "T2", "C-D")
+    assert first.end_time <= second.start_time or second.end_time <= first.start_time
+    assert result.total_delay_minutes > 0
+
+def test_delayed_train_gets_own_platform():
+    tracks = [
+        TrackData(segment_id="A-B", from_station="A", to_station="B"),
+        TrackData(segment_id="C-B", from_station="C", to_station="B")
+    ]
+    late = _departing_now("T2", ["C", "B"])
+    late.scheduled_arrival += timedelta(minutes=30)
+    trains = [_departing_now("T1", ["A", "B"]), late]
+    optimizer = RailwayOptimizer(config=OptimizationConfig(relative_gap_limit=0.0))
+    conditions = NetworkConditions(maintenance_windows=[MaintenanceWindow(track_id="A-B", start_minute=0, end_minute=29)])
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=120, conditions=conditions)
+    
+    # Planned 30 minutes apart, the maintenance delay brings T1 into B with T2
+    assert _entry(result, "T1", "A-B").end_time == _entry(result, "T2", "C-B").end_time
+    platform = optimizer.variables['p']
+    assert optimizer.solver.Value(platform["T1"]["B"]) != optimizer.solver.Value(platform["T2"]["B"])
+
+class _FrozenDatetime(datetime):
+    """datetime whose now() stays on one minute, so separate requests share a time origin"""
+    
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 1, 12, 0, 0)
+
+def test_cached_resolve_matches_fresh_build(monkeypatch):
+    monkeypatch.setattr("src.optimizer.datetime", _FrozenDatetime)
+    _, tracks = _corridor(0, 3)
+    
+    def request(departures, priorities):
+        return [
+            TrainData(
+                train_id=f"T{i}",
+                current_position="S0",
+                scheduled_arrival=_FrozenDatetime.now() + timedelta(minutes=departure),
+                priority=priority,
+                destination="S3",
+                route=["S0", "S1", "S2", "S3"]
+            )
+            for i, (departure, priority) in enumerate(zip(departures, priorities))
+        ]
+    
+    optimizer = RailwayOptimizer(config=OptimizationConfig(relative_gap_limit=0.0))
+    optimizer.optimize(trains=request([10, 11, 12], [5, 3, 1]), tracks=tracks, conflicts=[], time_horizon=240)
+    
+    changed = request([30, 0, 4], [1, 5, 2])
+    result = optimizer.optimize(trains=changed, tracks=tracks, conflicts=[], time_horizon=240)
+    fresh = RailwayOptimizer(config=OptimizationConfig(relative_gap_limit=0.0)).optimize(
+        trains=changed, tracks=tracks, conflicts=[], time_horizon=240
+    )
+    
+    # Re-solved on the cached model, with the start constants rewritten in place
+    assert len(optimizer._model_cache) == 1
+    for train_id, departure in [("T0", 30), ("T1", 0), ("T2", 4)]:
+        assert list(optimizer.start_constraints[train_id].Proto().linear.domain) == [departure, departure]
+    assert result.objective_value == pytest.approx(fresh.objective_value, abs=1e-6)
+
+def _corridor(n_trains, n_tracks):
+    """Trains running three-segment stretches of a single-track line of n_tracks segments, two minutes apart"""
+    stations = [f"S{i}" for i in range(n_tracks + 1)]
+    tracks = [
+        TrackData(segment_id=f"{stations[i]}-{stations[i + 1]}", from_station=stations[i], to_station=stations[i + 1])
+        for i in range(n_tracks)
+    ]
+    stops = min(4, n_tracks + 1)
+    trains = [
+        TrainData(
+            train_id=f"T{i}",
+            current_position=stations[i % (n_tracks + 2 - stops)],
+            scheduled_arrival=ANCHOR_TIME + timedelta(minutes=10 + 2 * i),
+            priority=1 + i % 5,
+            destination=stations[i % (n_tracks + 2 - stops) + stops - 1],
+            route=stations[i % (n_tracks + 2 - stops):i % (n_tracks + 2 - stops) + stops]
+        )
+        for i in range(n_trains)
+    ]
+    return trains, tracks
+
+@pytest.mark.slow
+@pytest.mark.parametrize("n_trains,n_tracks", [(2, 3), (10, 15), (50, 80)])
+def test_optimization_scaling(n_trains, n_tracks):
+    trains, tracks = _corridor(n_trains, n_tracks)
+    optimizer = RailwayOptimizer(config=OptimizationConfig(max_solve_time_seconds=5))
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=240)
+    
+    assert len(result.schedule) == sum(len(train.route) - 1 for train in trains)
+    assert result.total_delay_minutes >= 0
+
+def _brute_force_objective(optimizer, trains, tracks, horizon):
+    """
+    Optimal objective by enumerating every train order on every track. For a
+    fixed order the model is a system of difference constraints, whose least
+    solution is optimal because every objective weight is positive
+    """
+    config = optimizer.config
+    headway = config.headway_buffer_minutes + 3
+    max_delay = min(120, horizon // 2)
+    segments = {train.train_id: optimizer._get_route_segments(train, tracks) for train in trains}
+    scheduled = {train.train_id: max(optimizer.scheduled_starts[train.train_id], 0) for train in trains}
+    users = {}
+    for train in trains:
+        for segment_id in segments[train.train_id]:
+            users.setdefault(segment_id, []).append(train.train_id)
+    
+    # (u, v, c): time v >= time u + c
+    fixed = []
+    lower = {}
+    for train_id, route in segments.items():
+        for position, segment_id in enumerate(route):
+            lower[("start", train_id, segment_id)] = scheduled[train_id] if position == 0 else 0
+            lower[("end", train_id, segment_id)] = 0
+            fixed.append((("start", train_id, segment_id), ("end", train_id, segment_id), config.min_segment_minutes))
+        for current_segment, next_segment in zip(route, route[1:]):
+            fixed.append((("end", train_id, current_segment), ("start", train_id, next_segment), 0))
+            fixed.append((("start", train_id, next_segment), ("end", train_id, current_segment), 0))
+    
+    best = None
+    for orders in itertools.product(*(itertools.permutations(ids) for ids in users.values())):
+        edges = list(fixed)
+        for segment_id, order in zip(users, orders):
+            edges += [(("end", a, segment_id), ("start", b, segment_id), headway) for a, b in zip(order, order[1:])]
+        
+        times = dict(lower)
+        for _ in range(len(times) + 1):
+            changed = False
+            for u, v, gap in edges:
+                if times[u] + gap > times[v]:
+                    times[v] = times[u] + gap
+                    changed = True
+            if not changed:
+                break
+        else:
+            continue  # Cyclic order
+        
+        delays = {train_id: times[("start", train_id, route[0])] - scheduled[train_id] for train_id, route in segments.items()}
+        journeys = {train_id: times[("end", train_id, route[-1])] for train_id, route in segments.items()}
+        if any(delays[train_id] > max_delay or journeys[train_id] > horizon for train_id in segments):
+            continue
+        objective = sum(
+            config.delay_weight * ((6 - train.priority) * config.priority_multiplier + 0.01) * delays[train.train_id]
+            + config.delay_weight * 0.1 * journeys[train.train_id]
+            for train in trains
+        )
+        if best is None or objective < best:
+            best = objective
+    return best
+
+@pytest.mark.parametrize("departures,priorities,routes", [
+    # Presolve in OR-Tools 9.8 reported 82.18 as optimal here
+    ([10, 11, 12], [5, 3, 1], [["S0", "S1", "S2", "S3"]] * 3),
+    ([0, 3, 20], [1, 2, 4], [["S0", "S1", "S2", "S3"], ["S1", "S2", "S3"], ["S0", "S1", "S2"]]),
+    ([5, 5, 6, 30], [3, 1, 2, 5], [["S0", "S1", "S2"], ["S1", "S2", "S3"], ["S0", "S1", "S2", "S3"], ["S2", "S3"]]),
+])
+def test_optimal_objective_matches_brute_force(departures, priorities, routes):
+    _, tracks = _corridor(0, 3)
+    now = datetime.now().replace(second=0, microsecond=0)
+    trains = [
+        TrainData(
+            train_id=f"T{i}",
+            current_position=route[0],
+            scheduled_arrival=now + timedelta(minutes=departure),
+            priority=priority,
+            destination=route[-1],
+            route=route
+        )
+        for i, (departure, priority, route) in enumerate(zip(departures, priorities, routes))
+    ]
+    optimizer = RailwayOptimizer(config=OptimizationConfig(relative_gap_limit=0.0))
+    
+    result = optimizer.optimize(trains=trains, tracks=tracks, conflicts=[], time_horizon=240)
+    
+    assert result.objective_value == pytest.approx(_brute_force_objective(optimizer, trains, tracks, 240), abs=1e-6)
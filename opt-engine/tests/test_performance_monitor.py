@@ -0,0 +1,91 @@
+import json
+import pytest
+import zstandard
+from src.performance_monitor import PerformanceMonitor, SUMMARY_WINDOW
+
+def _record(monitor, objective, status="OPTIMAL", conflicts_resolved=0):
+    monitor.start_optimization(num_trains=2, num_tracks=3, num_conflicts=1)
+    monitor.end_optimization(objective_value=objective, conflicts_resolved=conflicts_resolved,
+                             total_delay=0, solver_status=status)
+
+def test_summary_without_runs():
+    assert PerformanceMonitor().get_performance_summary() == {"message": "No optimization runs recorded"}
+
+def test_success_rate_window():
+    monitor = PerformanceMonitor()
+    _record(monitor, 1.0, status="INFEASIBLE")
+    for _ in range(SUMMARY_WINDOW - 1):
+        _record(monitor, 1.0)
+    assert monitor.get_performance_summary()["success_rate_percent"] == 90.0
+    
+    # The failed run's bit is shifted out of the window
+    _record(monitor, 1.0, status="FEASIBLE")
+    summary = monitor.get_performance_summary()
+    assert summary["success_rate_percent"] == 100.0
+    assert summary["total_runs"] == SUMMARY_WINDOW + 1
+    assert summary["recent_runs"] == SUMMARY_WINDOW
+
+def test_running_sums_cover_recent_runs():
+    monitor = PerformanceMonitor()
+    runs = SUMMARY_WINDOW + 5
+    for i in range(runs):
+        _record(monitor, float(i), conflicts_resolved=i)
+    
+    recent = range(runs - SUMMARY_WINDOW, runs)
+    summary = monitor.get_performance_summary()
+    assert summary["average_objective_value"] == pytest.approx(sum(recent) / SUMMARY_WINDOW)
+    assert summary["average_conflicts_resolved"] == pytest.approx(sum(recent) / SUMMARY_WINDOW)
+    assert summary["last_run"]["objective"] == runs - 1
+
+def test_summary_reused_until_next_run():
+    monitor = PerformanceMonitor()
+    _record(monitor, 1.0)
+    summary = monitor.get_performance_summary()
+    assert monitor.get_performance_summary() is summary
+    
+    _record(monitor, 3.0)
+    refreshed = monitor.get_performance_summary()
+    assert refreshed is not summary
+    assert refreshed["average_objective_value"] == 2.0
+    assert refreshed["last_run"]["objective"] == 3.0
+
+def test_export_metrics(tmp_path):
+    monitor = PerformanceMonitor()
+    _record(monitor, 5.0)
+    
+    path = monitor.export_metrics(str(tmp_path / "metrics.json"))
+    
+    with open(path, 'rb') as f:
+        exported = json.loads(f.read())
+    assert exported["total_runs"] == 1
+    assert exported["detailed_metrics"][0]["objective_value"] == 5.0
+
+def test_export_metrics_compressed(tmp_path):
+    monitor = PerformanceMonitor()
+    _record(monitor, 5.0)
+    
+    path = monitor.export_metrics(str(tmp_path / "metrics.json"), compress=True)
+    
+    assert path.endswith(".json.zst")
+    with open(path, 'rb') as f:
+        exported = json.loads(zstandard.ZstdDecompressor().stream_reader(f).read())
+    assert exported["summary"]["total_runs"] == 1
+    assert exported["detailed_metrics"][0]["solver_status"] == "OPTIMAL"
+
+def test_overlapping_runs_record_separately():
+    monitor = PerformanceMonitor()
+    first = monitor.start_optimization(num_trains=2, num_tracks=3, num_conflicts=1)
+    second = monitor.start_optimization(num_trains=7, num_tracks=9, num_conflicts=0)
+    monitor.set_model_complexity(10, 20, run=first)
+    
+    monitor.end_optimization(objective_value=1.0, conflicts_resolved=0, total_delay=0,
+                             solver_status="OPTIMAL", run=first)
+    monitor.end_optimization(objective_value=2.0, conflicts_resolved=0, total_delay=0,
+                             solver_status="FEASIBLE", run=second)
+    
+    detailed = monitor.get_detailed_metrics()
+    assert [(m["num_trains"], m["objective_value"], m["solver_status"]) for m in detailed] == [
+        (2, 1.0, "OPTIMAL"), (7, 2.0, "FEASIBLE")
+    ]
+    assert (detailed[0]["variables_count"], detailed[1]["variables_count"]) == (10, 0)
+    assert detailed[0]["timestamp"] <= detailed[1]["timestamp"]